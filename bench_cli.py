@@ -0,0 +1,102 @@
+"""
+Mide el caudal sostenido del cliente de línea de comandos (`chat_cli`).
+
+Uso:
+    python bench_cli.py                  # 100000 líneas, 3 ejecuciones.
+    python bench_cli.py --lines 20000    # Número de líneas por ejecución.
+    python bench_cli.py --runs 5         # Número de ejecuciones (se informa la mediana).
+
+Arranca un servidor local sin límite de mensajes por cliente (como
+`python server_manager.py --message-rate=0 --byte-rate=0`), un `chat_cli --tail` que
+escucha la sala y otro `chat_cli` al que se le pasan las líneas por la entrada estándar.
+Se mide desde que se lanza el emisor hasta que el oyente escribió la última línea.
+"""
+import statistics  # Importamos statistics para calcular la mediana.
+import subprocess  # Importamos subprocess para lanzar los clientes en procesos aparte.
+import sys  # Importamos sys para leer argumentos y localizar el intérprete.
+import threading  # Importamos threading para leer al oyente en segundo plano.
+import time  # Importamos time para medir los tiempos.
+
+import server_manager  # Arranque y sondas de salud del servidor.
+
+BENCH_PORT = 5098  # Puerto del servidor local que se usa para medir.
+CONNECT_TIMEOUT = 10  # Segundos máximos de espera para que el oyente se conecte.
+RUN_TIMEOUT = 120  # Segundos máximos de una ejecución antes de darla por fallida.
+
+
+def run_once(lines):
+    """
+    Envía `lines` líneas por un `chat_cli` y espera a que otro las escriba.
+
+    :param lines: Número de líneas que se envían.
+    :return: Segundos transcurridos.
+    """
+    cli = [sys.executable, "-m", "chat_cli", "--port", str(BENCH_PORT)]
+    listener = subprocess.Popen(
+        cli + ["--alias", "oyente", "--tail"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+    )
+    sender = None
+    try:
+        deadline = time.monotonic() + CONNECT_TIMEOUT
+        # Esperamos a que el oyente esté en la sala.
+        while (server_manager.check_health(port=BENCH_PORT) or {}).get("clients", 0) < 1:
+            if time.monotonic() > deadline:
+                raise RuntimeError("El oyente no se conectó al servidor.")
+            time.sleep(0.01)
+        data = "".join(f"línea de prueba número {i}\n" for i in range(lines)).encode("utf-8")
+        start = time.perf_counter()
+        sender = subprocess.Popen(
+            cli + ["--alias", "emisor"], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL
+        )
+        threading.Thread(target=sender.communicate, args=(data,), daemon=True).start()
+        received = [0]  # Líneas del emisor que escribió el oyente.
+        done = threading.Event()
+
+        def count():
+            for line in listener.stdout:
+                if line.startswith(b"emisor: "):  # Ignoramos los avisos de presencia.
+                    received[0] += 1
+                    if received[0] == lines:
+                        break
+            done.set()
+
+        # El oyente se lee en otro hilo para poder abandonar si las líneas no llegan.
+        threading.Thread(target=count, daemon=True).start()
+        done.wait(RUN_TIMEOUT)
+        elapsed = time.perf_counter() - start
+        if received[0] < lines:
+            raise RuntimeError(f"El oyente sólo recibió {received[0]} de {lines} líneas.")
+        if sender.wait(CONNECT_TIMEOUT) != 0:
+            raise RuntimeError(f"El emisor terminó con código {sender.returncode}.")
+        return elapsed
+    finally:
+        for process in (sender, listener):
+            if process:
+                process.kill()
+                process.wait()
+
+
+def main():
+    lines = int(sys.argv[sys.argv.index("--lines") + 1]) if "--lines" in sys.argv else 100000
+    runs = int(sys.argv[sys.argv.index("--runs") + 1]) if "--runs" in sys.argv else 3
+
+    # Sin límites por cliente: se mide el cliente, no la política del servidor.
+    server_manager.start_server(None, None, None, None, port=BENCH_PORT, message_rate=0, byte_rate=0)
+    try:
+        times = []
+        for _ in range(runs):
+            times.append(run_once(lines))
+            time.sleep(0.5)  # Deja que el servidor procese las desconexiones.
+    finally:
+        server_manager.stop_server()
+
+    elapsed = statistics.median(times)
+    print(f"Mediana de {runs} ejecuciones con {lines} líneas:")
+    print(f"  tiempo_s       {elapsed:10.3f}")
+    print(f"  lineas_por_s   {lines / elapsed:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
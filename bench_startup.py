@@ -0,0 +1,115 @@
+"""
+Mide el arranque de la interfaz de chat TCP.
+
+Uso:
+    python bench_startup.py              # Tiempo hasta la primera pintura y hasta estar conectado.
+    python bench_startup.py --importtime  # Además, los módulos más lentos según `-X importtime`.
+    python bench_startup.py --runs 10     # Número de ejecuciones (se informa la mediana).
+
+Cada medición se hace en un proceso nuevo para incluir el coste real de las importaciones.
+Requiere un entorno gráfico (la ventana se crea de verdad).
+"""
+import json  # Importamos json para comunicar los resultados del proceso hijo.
+import statistics  # Importamos statistics para calcular la mediana.
+import subprocess  # Importamos subprocess para lanzar cada medición en un proceso nuevo.
+import sys  # Importamos sys para leer argumentos y localizar el intérprete.
+import time  # Importamos time para medir los tiempos.
+
+BENCH_PORT = 5099  # Puerto del servidor local que se usa para medir la conexión.
+CONNECT_TIMEOUT = 10  # Segundos máximos de espera para considerar fallida la conexión.
+
+
+def child():
+    """
+    Medición dentro del proceso hijo: arranque de la ventana y conexión a un servidor local.
+    """
+    start = time.perf_counter()
+    import chat_tcp  # Importación que forma parte del arranque medido.
+
+    imported = time.perf_counter()
+    app = chat_tcp.TCPChat()
+    app.update()  # Procesa los eventos pendientes: la ventana queda dibujada.
+    painted = time.perf_counter()
+
+    # Servidor local para medir el tiempo hasta estar conectado.
+    import server_manager
+
+    server_manager.start_server(
+        on_client_connected=None,
+        on_client_disconnected=None,
+        on_message_received=None,
+        on_error=None,
+        port=BENCH_PORT,
+    )
+    app.entryPort.insert(0, str(BENCH_PORT))
+    app.entryAlias.insert(0, "bench")
+    clicked = time.perf_counter()
+    app.toggle_connection()  # Simula pulsar "Conectar".
+    click_returned = time.perf_counter()
+    while not app.connected and time.perf_counter() - clicked < CONNECT_TIMEOUT:
+        app.update()
+    connected = time.perf_counter()
+
+    app.close_application()
+    server_manager.stop_server()
+    print(
+        json.dumps(
+            {
+                "import_ms": (imported - start) * 1000,
+                "first_paint_ms": (painted - start) * 1000,
+                "click_blocked_ms": (click_returned - clicked) * 1000,
+                "connect_ms": (connected - clicked) * 1000 if app.connected else None,
+            }
+        )
+    )
+
+
+def import_profile(top=10):
+    """
+    Ejecuta `python -X importtime -c "import chat_tcp"` y devuelve los módulos más costosos.
+
+    :return: Lista de pares (microsegundos acumulados, módulo).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import chat_tcp"],
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        # Formato: "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    runs = int(sys.argv[sys.argv.index("--runs") + 1]) if "--runs" in sys.argv else 5
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child"], capture_output=True, text=True
+        )
+        if output.returncode != 0:
+            print(output.stderr)
+            sys.exit(1)
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    print(f"Mediana de {runs} ejecuciones:")
+    for key in ("import_ms", "first_paint_ms", "click_blocked_ms", "connect_ms"):
+        values = [r[key] for r in results if r[key] is not None]
+        print(f"  {key:<18} {statistics.median(values):8.1f}" if values else f"  {key:<18}   (falló)")
+
+    if "--importtime" in sys.argv:
+        print("Módulos más costosos al importar chat_tcp (acumulado, ms):")
+        for cumulative, name in import_profile():
+            print(f"  {cumulative / 1000:8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        child()
+    else:
+        main()
@@ -0,0 +1,87 @@
+"""
+Captura binaria del tráfico que recibe el servidor, para reproducirlo después con `replay.py`.
+"""
+import struct  # Importamos struct para el formato binario de los registros.
+import threading  # Importamos threading para escribir desde varios hilos a la vez.
+import time  # Importamos time para las marcas de tiempo monotónicas.
+
+# Formato del archivo de captura:
+#   MAGIC y, a continuación, registros con cabecera RECORD (tipo, id de conexión,
+#   nanosegundos desde el inicio de la captura, longitud) seguida de los datos.
+MAGIC = b"CHATCAP1"  # Identifica el archivo y la versión del formato.
+RECORD = struct.Struct("<BIQI")  # tipo (1 B), conexión (4 B), tiempo en ns (8 B), longitud (4 B).
+OPEN = 0  # Conexión aceptada; los datos son el alias.
+FRAME = 1  # Trama recibida del cliente; los datos son el contenido sin encabezado.
+CLOSE = 2  # Conexión cerrada; sin datos.
+BUFFER_SIZE = 1024 * 1024  # Búfer de escritura: el disco no se toca en cada trama.
+
+
+class CaptureWriter:
+    """
+    Graba en un archivo binario compacto todas las tramas que recibe el servidor.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Ruta del archivo de captura (se sobrescribe si existe).
+        """
+        self._file = open(path, "wb", buffering=BUFFER_SIZE)
+        self._file.write(MAGIC)
+        self._lock = threading.Lock()  # Los hilos lectores de cada cliente escriben aquí.
+        self._start = time.monotonic_ns()  # Origen de las marcas de tiempo.
+        self._ids = {}  # Conexión -> identificador numérico en la captura.
+        self._next_id = 0
+
+    def _write(self, kind, conn_id, data=b""):
+        """Escribe un registro con la marca de tiempo actual."""
+        with self._lock:
+            if self._file.closed:
+                return
+            elapsed = time.monotonic_ns() - self._start
+            self._file.write(RECORD.pack(kind, conn_id, elapsed, len(data)) + data)
+
+    def open(self, conn, alias):
+        """Registra una conexión nueva y le asigna un identificador."""
+        with self._lock:
+            conn_id = self._ids[conn] = self._next_id
+            self._next_id += 1
+        self._write(OPEN, conn_id, alias.encode("utf-8"))
+
+    def frame(self, conn, payload):
+        """Registra una trama recibida de una conexión."""
+        conn_id = self._ids.get(conn)
+        if conn_id is not None:
+            self._write(FRAME, conn_id, payload)
+
+    def close(self, conn):
+        """Registra el cierre de una conexión."""
+        with self._lock:
+            conn_id = self._ids.pop(conn, None)
+        if conn_id is not None:
+            self._write(CLOSE, conn_id)
+
+    def finish(self):
+        """Vacía el búfer y cierra el archivo."""
+        with self._lock:
+            self._file.close()
+
+
+def read_capture(path):
+    """
+    Lee un archivo de captura registro a registro, sin cargarlo entero en memoria.
+
+    :param path: Ruta del archivo de captura.
+    :return: Generador de tuplas (tipo, id de conexión, nanosegundos, datos).
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} no es un archivo de captura válido.")
+        while True:
+            header = file.read(RECORD.size)
+            if len(header) < RECORD.size:  # Fin del archivo (o registro truncado).
+                return
+            kind, conn_id, elapsed, length = RECORD.unpack(header)
+            data = file.read(length)
+            if len(data) < length:
+                return
+            yield kind, conn_id, elapsed, data
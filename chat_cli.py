@@ -0,0 +1,193 @@
+"""
+Cliente de chat sin interfaz gráfica para scripts, bots y tuberías.
+
+Uso:
+    cat alertas.log | python -m chat_cli --alias alertas          # Publica cada línea y termina.
+    python -m chat_cli --alias monitor --tail < /dev/null          # Sólo escucha la sala.
+    tail -f app.log | python -m chat_cli --alias app --json        # Publica y escucha en JSON.
+
+Cada línea de la entrada estándar se envía como un mensaje; las líneas se agrupan para
+enviarse en una sola escritura. Los mensajes recibidos se escriben en la salida estándar,
+uno por línea, como "alias: mensaje" o como objetos JSON (`--json`). Los errores van a la
+salida de errores. No depende de Tk.
+
+Con los límites por defecto el servidor acepta `server.MESSAGE_RATE` mensajes por segundo por
+cliente; para volúmenes mayores se arranca con otro límite, p. ej.
+`python server_manager.py --message-rate=0` (sin límite) o `--message-rate=5000`.
+"""
+import argparse  # Importamos argparse para leer los argumentos de la línea de comandos.
+import json  # Importamos json para la salida en formato JSON.
+import queue  # Importamos queue para las colas acotadas de entrada y salida.
+import sys  # Importamos sys para la entrada, la salida y el código de salida.
+import threading  # Importamos threading para leer, enviar y escribir a la vez.
+import time  # Importamos time para las marcas de tiempo y el intervalo de agrupación.
+
+from client import Client  # Cliente TCP del chat.
+
+BATCH_INTERVAL = 0.01  # Segundos máximos que una línea espera a juntarse con otras.
+BATCH_MAX = 256  # Líneas máximas por escritura.
+QUEUE_SIZE = 4096  # Líneas en espera; si se llena, se frena la lectura de la entrada.
+
+
+class ChatCLI:
+    """
+    Une la entrada y la salida estándar con una sesión del chat.
+    """
+
+    def __init__(self, host, port, alias, as_json=False, output=None, on_error=None):
+        """
+        :param host: Dirección del servidor de chat (admite "unix:/ruta").
+        :param port: Puerto del servidor de chat.
+        :param alias: Alias con el que se publica en el chat.
+        :param as_json: Si es True, cada mensaje recibido se escribe como un objeto JSON.
+        :param output: Flujo de texto donde escribir los mensajes recibidos (por defecto stdout).
+        :param on_error: Callback para manejar errores.
+        """
+        self.as_json = as_json
+        self.output = output or sys.stdout
+        self.on_error = on_error
+        self.sent = 0  # Líneas enviadas al servidor.
+        self._to_server = queue.Queue(maxsize=QUEUE_SIZE)  # Líneas pendientes de enviar.
+        self._to_output = queue.Queue()  # Líneas pendientes de escribir en la salida.
+        self._failed = threading.Event()  # Se activa si no se pudo reconectar.
+        structured = {}  # En texto plano, el cliente entrega presencia y usuarios como "Sistema".
+        if as_json:
+            structured = {
+                "on_presence": lambda joined, left: self._emit("presence", joined=joined, left=left),
+                "on_roster": lambda users: self._emit("roster", users=users),
+            }
+        self.client = Client(
+            host,
+            alias,
+            port=port,
+            on_message_received=lambda a, m: self._emit("message", alias=a, text=m),
+            on_direct_message=lambda a, m: self._emit("direct", alias=a, text=m),
+            on_error=self._handle_error,
+            **structured,
+        )
+        self._sender = threading.Thread(target=self._send_loop, daemon=True)
+        self._sender.start()
+        threading.Thread(target=self._write_loop, daemon=True).start()
+
+    @property
+    def connected(self):
+        return self.client.connected
+
+    def send(self, line):
+        """Encola una línea para enviarla; bloquea si hay demasiadas pendientes."""
+        self._to_server.put(line)
+
+    def finish(self):
+        """Envía las líneas pendientes y espera a que salgan. Devuelve False si se perdieron."""
+        self._to_server.put(None)  # Marca de fin para el hilo emisor.
+        self._sender.join()
+        return not self._failed.is_set()
+
+    def close(self):
+        """
+        Cierra la sesión de forma ordenada y vacía la salida.
+
+        :return: True si el servidor confirmó, al cerrar la conexión, que procesó todo lo enviado.
+        """
+        connected = self.client.connected
+        drained = self.client.drain()
+        if connected and not drained:
+            self._handle_error("El servidor no cerró la conexión a tiempo; los últimos mensajes pueden haberse perdido.")
+        self.client.close()
+        self._to_output.put(None)
+        self._to_output.join()
+        return drained
+
+    def _send_loop(self):
+        """Agrupa las líneas pendientes y las envía con una sola escritura por lote."""
+        done = False
+        while not done:
+            batch = [self._to_server.get()]
+            deadline = time.monotonic() + BATCH_INTERVAL
+            while len(batch) < BATCH_MAX:  # Juntamos lo que llegue durante el intervalo.
+                try:
+                    batch.append(self._to_server.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            while batch and not self.client.send_messages(batch):
+                if not self.client.reconnect():  # Ya informó del error por `on_error`.
+                    self._failed.set()
+                    return
+            self.sent += len(batch)
+
+    def _emit(self, kind, **fields):
+        """Da formato a un evento recibido y lo deja listo para la salida."""
+        if self.as_json:
+            line = json.dumps({"type": kind, "ts": round(time.time(), 3), **fields}, ensure_ascii=False)
+        else:
+            prefix = "[privado] " if kind == "direct" else ""
+            line = f"{prefix}{fields['alias']}: {fields['text']}".replace("\n", " ")  # Una línea por mensaje.
+        self._to_output.put(line)
+
+    def _write_loop(self):
+        """Escribe en la salida todas las líneas disponibles de una vez y la vacía."""
+        while True:
+            lines = [self._to_output.get()]
+            while True:
+                try:
+                    lines.append(self._to_output.get_nowait())
+                except queue.Empty:
+                    break
+            end = lines[-1] is None
+            if end:
+                lines.pop()
+            if lines:
+                self.output.write("\n".join(lines) + "\n")
+                self.output.flush()  # Quien lea la tubería recibe los mensajes sin esperar.
+            for _ in range(len(lines) + end):
+                self._to_output.task_done()
+            if end:
+                return
+
+    def _handle_error(self, error_message):
+        """Maneja errores y los pasa al callback correspondiente."""
+        if self.on_error:
+            self.on_error(error_message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cliente de chat para la línea de comandos.")
+    parser.add_argument("--host", default="127.0.0.1", help="Dirección del servidor de chat.")
+    parser.add_argument("--port", type=int, default=5000, help="Puerto del servidor de chat.")
+    parser.add_argument("--alias", default="chat_cli", help="Alias con el que se publica.")
+    parser.add_argument("--json", action="store_true", help="Escribe los mensajes recibidos en JSON.")
+    parser.add_argument("--tail", action="store_true", help="Sigue escuchando al terminar la entrada.")
+    args = parser.parse_args()
+
+    cli = ChatCLI(
+        args.host, args.port, args.alias, args.json,
+        on_error=lambda m: print(f"[ERROR] {m}", file=sys.stderr),
+    )
+    if not cli.connected:
+        sys.exit(1)
+    ok = False
+    try:
+        for line in sys.stdin:
+            line = line.rstrip("\r\n")
+            if line:
+                cli.send(line)
+        ok = cli.finish()
+        while ok and args.tail:
+            # Tras un reinicio del servidor el cliente se reconecta solo; si no lo logra, salimos.
+            if not cli.connected and not cli.client.reconnect():
+                ok = False
+            time.sleep(1)
+    except KeyboardInterrupt:
+        ok = True
+    finally:
+        # Antes de salir esperamos a que el servidor procese lo enviado: si no, las
+        # últimas líneas de la entrada podrían perderse sin ningún aviso.
+        ok = cli.close() and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,9 @@
 # Importo las librerías necesarias
 import customtkinter as ctk  
-import serial 
-import serial.tools.list_ports 
 import threading  
 import time
 from datetime import datetime
+# pyserial (serial) lo importo al usarlo por primera vez: no hace falta para mostrar la ventana
 
 class SerialChat(ctk.CTk):
     def __init__(self):
@@ -21,6 +20,7 @@ class SerialChat(ctk.CTk):
         self.stop_thread = False  # Controla cuándo detener el hilo de recepción
         self.last_message_date = None  # Última fecha de mensaje mostrado
         self.provisional_text = "Escriba un mensaje"  # Texto inicial de la caja de entrada
+        self.searching_text = "Buscando puertos..."  # Texto del menú mientras se enumeran los puertos
 
         # Defino los marcos de la interfaz
         self.frm1 = ctk.CTkFrame(self)  # Marco para configuración del puerto COM
@@ -34,7 +34,7 @@ class SerialChat(ctk.CTk):
 
         # --- Configuración del puerto COM (Frame 1) ---
         self.lblCOM = ctk.CTkLabel(self.frm1, text="Puerto COM:")  # Etiqueta para indicar puerto
-        self.cboPort = ctk.CTkOptionMenu(self.frm1, values=self.get_com_ports())  # Menú desplegable con puertos disponibles
+        self.cboPort = ctk.CTkOptionMenu(self.frm1, values=[self.searching_text])  # Menú desplegable, se llena al terminar la búsqueda
         self.btnConnect = ctk.CTkButton(self.frm1, text="Conectar", command=self.toggle_connection)  # Botón para conectar/desconectar
 
         # Organizo los elementos en una cuadrícula dentro del marco
@@ -62,12 +62,31 @@ class SerialChat(ctk.CTk):
         # Evento para cerrar la ventana correctamente
         self.protocol("WM_DELETE_WINDOW", self.close_application)
 
+        # Enumero los puertos en segundo plano para que la ventana aparezca sin esperar
+        threading.Thread(target=self.load_com_ports, daemon=True).start()
+
     # --- Funciones para manejar puertos COM ---
     def get_com_ports(self):
         """Obtiene una lista de puertos COM disponibles."""
+        import serial.tools.list_ports  # Importación diferida: sólo se carga al buscar puertos
         ports = serial.tools.list_ports.comports()  # Lista de puertos disponibles
         return [port.device for port in ports] or ["No hay puertos"]  # Devuelve los puertos o un mensaje si no hay ninguno
 
+    def load_com_ports(self):
+        """Busca los puertos COM fuera del hilo de la interfaz y actualiza el menú al terminar."""
+        try:
+            ports = self.get_com_ports()
+        except Exception as e:
+            # Si falla la búsqueda (por ejemplo, pyserial no está instalado), lo muestro
+            self.after(0, self.display_center_message, f"Error al buscar puertos: {e}")
+            ports = ["No hay puertos"]
+        self.after(0, self.update_com_ports, ports)  # Tkinter sólo se toca desde el hilo principal
+
+    def update_com_ports(self, ports):
+        """Actualiza el menú desplegable con los puertos encontrados."""
+        self.cboPort.configure(values=ports)
+        self.cboPort.set(ports[0])  # Selecciono el primer puerto disponible
+
     def toggle_connection(self):
         """Establece o cierra la conexión al puerto COM."""
         if not self.connected:  # Si no está conectado
@@ -76,8 +95,12 @@ class SerialChat(ctk.CTk):
                 if port == "No hay puertos":  # Si no hay puertos, muestro un mensaje de error
                     self.display_center_message("Error: No hay puertos COM disponibles. Por favor, conecta un dispositivo.")
                     return
+                if port == self.searching_text:  # Todavía se están buscando los puertos
+                    self.display_center_message("Buscando puertos COM, espera un momento.")
+                    return
 
                 # Intento establecer la conexión serial
+                import serial  # Importación diferida de pyserial
                 self.serial_conn = serial.Serial(port=port, baudrate=9600, timeout=2)
                 self.connected = True  # Marco la conexión como activa
                 self.stop_thread = False  # Habilito el hilo de recepción
@@ -1,8 +1,10 @@
 import customtkinter as ctk  # Biblioteca para la interfaz gráfica personalizable.
-from client import Client  # Clase para manejar las funcionalidades del cliente TCP.
-import server_manager  # Módulo para manejar la lógica del servidor.
 from datetime import datetime  # Manejo de fechas y horas.
 import threading  # Biblioteca para manejar hilos.
+import os  # Manejo de rutas de archivos.
+
+# Los módulos `client`, `server_manager` y `tkinter.filedialog` se importan al usarse por
+# primera vez: no son necesarios para mostrar la ventana y así el arranque es más rápido.
 
 class TCPChat(ctk.CTk):
     def __init__(self):
@@ -63,9 +65,11 @@ class TCPChat(ctk.CTk):
         self.inText.configure(state="normal", fg_color="#333333", text_color="gray", undo=True)  # Configuración de estilo.
         self.btnSend = ctk.CTkButton(self.frm3, text="Enviar", command=self.send_message)  # Botón de enviar.
         self.btnSend.grid_forget()  # Inicialmente ocultamos el botón.
+        self.btnFile = ctk.CTkButton(self.frm3, text="Adjuntar", width=80, command=self.send_file)  # Botón para enviar archivos.
 
         # Posicionamiento del área de texto en frm3.
         self.inText.grid(row=0, column=0, padx=5, pady=5, sticky="ew")  # Configuración de área de entrada.
+        self.btnFile.grid(row=0, column=2, padx=5, pady=5)  # Botón de adjuntar archivos.
         self.frm3.columnconfigure(0, weight=1)  # Configuración para que ocupe todo el espacio horizontal.
 
         # Eventos para manejar la interacción del área de texto.
@@ -90,13 +94,12 @@ class TCPChat(ctk.CTk):
                 self.display_center_message("Error: El alias no puede estar vacío.")
                 return
 
-            # Verifica si el servidor está en ejecución.
-            if server_manager.is_server_running(host, port):
-                # Inicia un hilo para manejar la conexión del cliente.
-                threading.Thread(target=self.start_client, args=(host, port, alias), daemon=True).start()
-            else:
-                # Muestra un error si el servidor no está en ejecución.
-                self.display_center_message("Servidor no encontrado. Inicie el servidor primero.")
+            # Deshabilita el botón mientras se conecta para evitar dobles clics.
+            self.btnConnect.configure(state="disabled", text="Conectando...")
+
+            # La verificación del servidor y la conexión se hacen en un hilo aparte
+            # para no bloquear la interfaz.
+            threading.Thread(target=self.start_client, args=(host, port, alias), daemon=True).start()
         else:
             # Si ya está conectado, cierra la conexión.
             self.close_connection()
@@ -104,34 +107,59 @@ class TCPChat(ctk.CTk):
 
     def start_client(self, host, port, alias):
         """
-        Inicia el cliente y establece la conexión con el servidor.
+        Verifica el servidor, inicia el cliente y establece la conexión (se ejecuta fuera del hilo de la interfaz).
         """
         try:
+            import server_manager  # Módulo para manejar la lógica del servidor.
+            from client import Client  # Clase para manejar las funcionalidades del cliente TCP.
+
+            # Verifica si el servidor está en ejecución.
+            if not server_manager.is_server_running(host, port):
+                # Muestra un error si el servidor no está en ejecución.
+                self.display_center_message("Servidor no encontrado. Inicie el servidor primero.")
+                return
+
             # Crea una instancia de la clase Client para conectarse al servidor.
             self.client = Client(
                 host,
                 alias,
+                port=port,  # Puerto indicado en la interfaz.
                 on_message_received=self.handle_client_message,  # Callback para manejar mensajes recibidos.
                 on_error=self.handle_client_error,  # Callback para manejar errores.
+                on_file_received=self.handle_file_received,  # Callback para archivos recibidos.
+                on_direct_message=self.handle_direct_message,  # Callback para mensajes privados.
             )
+            if not self.client.connected:  # El servidor rechazó la conexión (p. ej. alias en uso).
+                self.client = None
+                return
             self.connected = True  # Marca al cliente como conectado.
 
-            # Deshabilita las entradas de configuración para evitar cambios durante la conexión.
-            self.entryHost.configure(state="disabled")
-            self.entryPort.configure(state="disabled")
-            self.entryAlias.configure(state="disabled")
-
-            # Cambia el texto del botón para indicar que ahora sirve para desconectar.
-            self.btnConnect.configure(text="Desconectar")
-
-            # Habilita el área de entrada de mensajes.
-            self.inText.configure(state="normal")
-
-            # Muestra un mensaje centrado indicando que la conexión fue exitosa.
-            self.display_center_message(f"Conectado a {host}:{port} como {alias}")
+            # Actualiza la interfaz en el hilo principal.
+            self.after(0, self._on_connected_ui, host, port, alias)
         except Exception as e:
             # Muestra un mensaje de error si algo falla al conectar.
             self.display_center_message(f"Error al conectar: {e}")
+        finally:
+            if not self.connected:  # Si no se pudo conectar, rehabilita el botón.
+                self.after(0, lambda: self.btnConnect.configure(state="normal", text="Conectar"))
+
+    def _on_connected_ui(self, host, port, alias):
+        """
+        Ajusta la interfaz una vez establecida la conexión.
+        """
+        # Deshabilita las entradas de configuración para evitar cambios durante la conexión.
+        self.entryHost.configure(state="disabled")
+        self.entryPort.configure(state="disabled")
+        self.entryAlias.configure(state="disabled")
+
+        # Cambia el texto del botón para indicar que ahora sirve para desconectar.
+        self.btnConnect.configure(state="normal", text="Desconectar")
+
+        # Habilita el área de entrada de mensajes.
+        self.inText.configure(state="normal")
+
+        # Muestra un mensaje centrado indicando que la conexión fue exitosa.
+        self.display_center_message(f"Conectado a {host}:{port} como {alias}")
 
     def send_message(self):
         """
@@ -141,8 +169,21 @@ class TCPChat(ctk.CTk):
             msg = self.inText.get("0.0", "end").strip()  # Obtiene el mensaje ingresado en el área de texto.
             if msg:  # Solo envía si el mensaje no está vacío.
                 try:
-                    # Llama al método de la clase Client para enviar el mensaje al servidor.
-                    self.client.send_message(msg)
+                    if msg == "/usuarios":  # Comando para ver quién está conectado.
+                        self.client.request_roster()
+                        self.inText.delete("0.0", "end")
+                        return
+
+                    # Los mensajes con formato "@alias texto" se envían en privado.
+                    target, _, text = msg[1:].partition(" ")
+                    if msg.startswith("@") and target and text.strip():
+                        self.client.send_direct_message(target, text.strip())
+                        msg = f"(privado a {target}) {text.strip()}"
+                    elif not self.client.send_message(msg):
+                        # Sin conexión: el mensaje queda en la bandeja de salida y se envía al
+                        # reconectar, que intentamos en segundo plano.
+                        msg = f"{msg}\n(pendiente de envío)"
+                        threading.Thread(target=self.client.reconnect, daemon=True).start()
 
                     # Muestra el mensaje en la interfaz como enviado por el usuario.
                     self.log_message(msg, received=False)
@@ -153,6 +194,18 @@ class TCPChat(ctk.CTk):
                     # Muestra un mensaje de error si no se pudo enviar.
                     self.log_message(f"Error enviando mensaje: {e}", received=True)
 
+    def send_file(self):
+        """
+        Permite elegir un archivo y lo envía al resto de usuarios en fragmentos.
+        """
+        if self.client and self.connected:  # Asegura que el cliente esté conectado.
+            from tkinter import filedialog  # Diálogo para elegir archivos adjuntos.
+
+            path = filedialog.askopenfilename(title="Seleccione un archivo")  # Diálogo para elegir el archivo.
+            if path:  # Solo envía si se eligió un archivo.
+                self.client.send_file(path)  # El envío se realiza en segundo plano.
+                self.log_message(f"Archivo enviado: {os.path.basename(path)}", received=False)
+
     def send_message_from_enter(self, event):
         """
         Envía un mensaje al presionar la tecla Enter.
@@ -245,6 +298,18 @@ class TCPChat(ctk.CTk):
         else:  # Si es un mensaje de otro usuario.
             self.log_message(f"{alias}: {message}", received=True)  # Lo muestra en el historial.
 
+    def handle_direct_message(self, alias, message):
+        """
+        Manejador para mensajes privados recibidos.
+        """
+        self.log_message(f"(privado) {alias}: {message}", received=True)
+
+    def handle_file_received(self, alias, path):
+        """
+        Manejador para archivos recibidos completamente.
+        """
+        self.display_center_message(f"{alias} envió un archivo: {path}")
+
     def handle_client_error(self, error_message):
         """
         Manejador para errores relacionados con el cliente.
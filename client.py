@@ -1,46 +1,136 @@
+import hashlib  # Importamos hashlib para dar a cada alias un archivo de bandeja propio.
+import json  # Importamos json para interpretar las tramas de presencia y la lista de usuarios.
+import os  # Importamos os para manejar las rutas de los archivos recibidos.
+import random  # Importamos random para repartir las reconexiones en el tiempo.
 import socket  # Importamos el módulo socket para manejar la conexión cliente-servidor.
 import threading  # Importamos threading para manejar el cliente y recibir mensajes simultáneamente.
+import time  # Importamos time para esperar entre reintentos de conexión.
+import uuid  # Importamos uuid para generar identificadores de transferencias.
+
+import protocol  # Funciones y constantes compartidas del protocolo de tramas.
+from outbox import Outbox  # Mensajes pendientes hasta que el servidor los confirma.
 
 # Constantes globales
 PORT = 5000  # Puerto en el que se conectará el cliente.
-HEADER_SIZE = 10  # Tamaño del encabezado que indica la longitud del mensaje.
+HEADER_SIZE = protocol.HEADER_SIZE  # Tamaño del encabezado que indica la longitud del mensaje.
+DOWNLOAD_DIR = "descargas"  # Carpeta donde se guardan los archivos recibidos.
+OUTBOX_DIR = "pendientes"  # Carpeta de las bandejas de salida (una por alias).
+HANDSHAKE_TIMEOUT = 5  # Segundos que se espera la respuesta del servidor al enviar el alias.
+DRAIN_TIMEOUT = 30  # Segundos máximos que `drain()` espera a que el servidor cierre la conexión.
+RECONNECT_ATTEMPTS = 5  # Intentos de reconexión antes de rendirse.
+RECONNECT_BASE_DELAY = 0.5  # Espera inicial (s) entre intentos; se duplica en cada fallo.
+
+
+def _safe_filename(text):
+    """Convierte un alias en un nombre de archivo sin separadores de ruta ni ".."."""
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in text) or "_"
+
+
+def _outbox_path(outbox_dir, alias):
+    """
+    Devuelve el archivo de bandeja de un alias. El resumen del alias evita que dos alias
+    distintos (p. ej. "a.b" y "a_b", o "Ana" y "ana" en Windows) compartan archivo.
+    """
+    digest = hashlib.sha256(alias.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(outbox_dir, f"{_safe_filename(alias)}-{digest}.jsonl")
 
 
 # Definimos la clase `Client` que representa al cliente TCP.
 class Client:
     def __init__(
-        self, address, username="chat_user", on_message_received=None, on_error=None
+        self,
+        address,
+        username="chat_user",
+        on_message_received=None,
+        on_error=None,
+        on_file_received=None,
+        download_dir=DOWNLOAD_DIR,
+        on_direct_message=None,
+        on_presence=None,
+        on_roster=None,
+        port=PORT,
+        outbox_dir=OUTBOX_DIR,
     ):
         """
         Inicializa el cliente TCP.
 
-        :param address: Dirección IP del servidor al que se conectará el cliente.
+        :param address: Dirección del servidor: IPv4, IPv6, nombre de host o "unix:/ruta"
+            para un socket Unix en el mismo equipo.
         :param username: Alias o nombre del usuario en el chat.
         :param on_message_received: Callback para manejar mensajes recibidos del servidor.
         :param on_error: Callback para manejar errores durante la ejecución.
+        :param on_file_received: Callback `(alias, ruta)` que se llama al completar un archivo recibido.
+        :param download_dir: Carpeta donde se escriben los archivos recibidos.
+        :param on_direct_message: Callback `(alias, mensaje)` para mensajes privados. Si no se
+            define, los mensajes privados se entregan a `on_message_received`.
+        :param on_presence: Callback `(unidos, desconectados)` con las listas de alias de cada lote
+            de presencia. Si no se define, se entrega un mensaje de "Sistema" a `on_message_received`.
+        :param on_roster: Callback `(usuarios)` con la respuesta a `request_roster`. Si no se
+            define, se entrega un mensaje de "Sistema" a `on_message_received`.
+        :param port: Puerto TCP del servidor (no se usa con sockets Unix).
+        :param outbox_dir: Carpeta donde `send_message` guarda los mensajes hasta que el servidor
+            los confirma, para reenviarlos al reconectar. None desactiva la bandeja de salida. Con
+            el alias anónimo "chat_user", o si otro proceso ya usa la bandeja del alias, sólo se
+            guarda en memoria.
         """
         self.username = username  # Guardamos el alias del usuario.
         self.address = address  # Dirección IP del servidor.
+        self.port = port  # Puerto del servidor.
         self.on_message_received = (
             on_message_received  # Callback para procesar mensajes recibidos.
         )
         self.on_error = on_error  # Callback para manejar errores.
+        self.on_file_received = on_file_received  # Callback para archivos recibidos.
+        self.on_direct_message = on_direct_message  # Callback para mensajes privados.
+        self.on_presence = on_presence  # Callback para altas y bajas de usuarios.
+        self.on_roster = on_roster  # Callback para la lista de usuarios conectados.
+        self.download_dir = download_dir  # Carpeta de descargas.
         self.connected = False  # Bandera para indicar si el cliente está conectado.
+        self.sock = None  # Socket actual; sigue en None si la primera conexión falla.
+        self._send_lock = threading.Lock()  # Evita que dos hilos mezclen tramas en el socket.
+        self._reconnect_lock = threading.Lock()  # Evita dos reconexiones simultáneas.
+        self._windows = {}  # Ventanas de control de flujo de los archivos enviados: id -> semáforo.
+        self._incoming = {}  # Archivos en recepción: (alias, id) -> (archivo, ruta).
+        self._closed = False  # Indica que el usuario cerró la conexión a propósito.
+        self._restart_jitter = None  # Ventana (s) de reconexión anunciada por el servidor al reiniciarse.
+        self.outbox = None  # Mensajes sin confirmar, también de ejecuciones anteriores.
+        if outbox_dir:
+            # 'chat_user' puede repetirse: varias instancias compartirían (y vaciarían) el archivo.
+            path = None if username == "chat_user" else _outbox_path(outbox_dir, username)
+            try:
+                self.outbox = Outbox(path)
+            except OSError as e:
+                self._handle_error(f"{e}; los mensajes pendientes sólo se guardarán en memoria.")
+                self.outbox = Outbox()
 
         try:
-            # Creamos un socket TCP para la conexión cliente-servidor.
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            # Intentamos conectarnos al servidor en la dirección y puerto proporcionados.
-            self.sock.connect((address, PORT))
-            self.connected = True  # Marcamos como conectado si no hay errores.
+            self._connect()
+        except Exception as e:
+            # Si hay un error durante la conexión, llamamos al callback de error.
+            self._handle_error(f"Error al conectar al servidor: {e}")
 
+    def _connect(self):
+        """
+        Abre el socket, realiza el saludo con el alias e inicia el hilo de recepción.
+        """
+        # Intentamos conectarnos al servidor en la dirección y puerto proporcionados,
+        # por TCP (IPv4/IPv6) o por socket Unix según la dirección.
+        self.sock = protocol.open_connection(self.address, self.port)
+        try:
             # Si la conexión es exitosa, enviamos el alias del cliente al servidor.
-            if self.connected:
-                # Creamos el encabezado con la longitud del alias.
-                alias_header = f"{len(self.username):<{HEADER_SIZE}}".encode("utf-8")
-                # Codificamos el alias y lo enviamos al servidor.
-                alias_data = self.username.encode("utf-8")
-                self.sock.send(alias_header + alias_data)
+            # Codificamos el alias con el encabezado de su longitud y lo enviamos al servidor.
+            self.sock.sendall(protocol.encode_frame(self.username))
+
+            # Esperamos a que el servidor acepte el alias (debe ser único).
+            self.sock.settimeout(HANDSHAKE_TIMEOUT)
+            reply = protocol.recv_frame(self.sock)
+            self.sock.settimeout(None)
+            if reply is None:
+                raise ConnectionError("El servidor cerró la conexión durante el saludo")
+            if protocol.control_kind(reply) == protocol.REJECT:
+                _, (reason,), _ = protocol.parse_control(reply, 1)
+                raise ConnectionError(reason)
+            self.connected = True  # Marcamos como conectado si no hay errores.
 
             # Iniciamos un hilo para recibir mensajes desde el servidor.
             self.receive_thread = threading.Thread(
@@ -48,9 +138,47 @@ class Client:
             )
             self.receive_thread.start()  # Ejecutamos el hilo en segundo plano.
 
-        except Exception as e:
-            # Si hay un error durante la conexión, llamamos al callback de error.
-            self._handle_error(f"Error al conectar al servidor: {e}")
+        except Exception:
+            self.connected = False
+            self.sock.close()
+            raise
+
+        # Antes que nada, enviamos lo que quedó sin confirmar: lo que no se envió mientras
+        # no había conexión y lo que se envió por la conexión anterior pero pudo perderse.
+        if self.outbox is not None:
+            self.outbox.rewind()
+            self._flush_outbox()
+
+    def reconnect(self, attempts=RECONNECT_ATTEMPTS):
+        """
+        Vuelve a conectarse al servidor, reintentando con espera exponencial.
+
+        Si ya hay conexión (por ejemplo, otro hilo acaba de reconectar) no hace nada.
+
+        :param attempts: Número máximo de intentos.
+        :return: True si la reconexión tuvo éxito.
+        """
+        with self._reconnect_lock:
+            if self.connected:
+                return True
+            if self.sock is not None:  # None si el servidor no estaba disponible al crear el cliente.
+                try:
+                    self.sock.close()
+                except OSError:
+                    pass
+            error = None
+            for attempt in range(attempts):
+                if self._closed:  # El usuario cerró el cliente mientras esperábamos.
+                    return False
+                try:
+                    self._connect()
+                    return True
+                except Exception as e:
+                    error = e
+                    # Espera exponencial con variación aleatoria para no reconectar todos a la vez.
+                    time.sleep(RECONNECT_BASE_DELAY * (2**attempt) * random.uniform(0.5, 1.0))
+            self._handle_error(f"No se pudo reconectar al servidor: {error}")
+            return False
 
     def receive_messages(self):
         """
@@ -58,18 +186,22 @@ class Client:
         """
         while self.connected:  # Seguimos recibiendo mientras estemos conectados.
             try:
-                # Leemos el encabezado del mensaje para obtener la longitud del contenido.
-                data_header = self.sock.recv(HEADER_SIZE)
+                # Leemos una trama completa (encabezado + contenido).
+                payload = protocol.recv_frame(self.sock)
                 if (
-                    not data_header
-                ):  # Si el encabezado está vacío, el servidor cerró la conexión.
-                    self._handle_error("Conexión cerrada por el servidor")
+                    payload is None
+                ):  # Si no hay trama, el servidor cerró la conexión.
+                    # Ni un reinicio anunciado ni un cierre propio (`close()`, `drain()`) son errores.
+                    if self.connected and not self._closed and self._restart_jitter is None:
+                        self._handle_error("Conexión cerrada por el servidor")
                     break
 
-                # Convertimos el encabezado a un entero para saber el tamaño del mensaje.
-                length = int(data_header.strip())
-                # Leemos el contenido del mensaje basado en la longitud recibida.
-                data = self.sock.recv(length).decode("utf-8")
+                # Las tramas de control (archivos) se procesan aparte.
+                if protocol.is_control(payload):
+                    self._handle_control(payload)
+                    continue
+
+                data = payload.decode("utf-8")
 
                 # Verificamos si el mensaje tiene el formato `alias|message`.
                 if "|" in data:
@@ -88,32 +220,352 @@ class Client:
 
             except Exception as e:
                 # Si hay un error durante la recepción, lo manejamos y salimos del bucle.
-                if self.connected:
+                if self.connected and self._restart_jitter is None:
                     self._handle_error(f"Error recibiendo mensajes: {e}")
                 break
+        self.connected = False  # La conexión se perdió: `reconnect()` puede restablecerla.
+        self._discard_incoming()  # Eliminamos los archivos que quedaron a medias.
+        if self.outbox is not None:
+            self.outbox.persist()  # Lo enviado sin confirmar se reenviará aunque se cierre el programa.
+
+        # Si el servidor anunció un reinicio, nos reconectamos en un instante aleatorio
+        # de la ventana indicada para no saturar al nuevo proceso.
+        if self._restart_jitter is not None and not self._closed:
+            jitter, self._restart_jitter = self._restart_jitter, None
+            time.sleep(random.uniform(0, jitter))
+            self.reconnect()
+
+    def _handle_control(self, payload):
+        """
+        Procesa una trama de control recibida del servidor.
+        """
+        kind = protocol.control_kind(payload)
+        if kind == protocol.RESTART:
+            _, (jitter_ms,), _ = protocol.parse_control(payload, 1)
+            self._restart_jitter = int(jitter_ms) / 1000
+        elif kind == protocol.PRESENCE:
+            _, _, data = protocol.parse_control(payload, 0)
+            presence = json.loads(data)
+            if self.on_presence:
+                self.on_presence(presence["joined"], presence["left"])
+            elif self.on_message_received:
+                # Traducimos el lote a un único mensaje del sistema.
+                parts = []
+                if presence["joined"]:
+                    parts.append(f"Se unieron al chat: {', '.join(presence['joined'])}.")
+                if presence["left"]:
+                    parts.append(f"Se desconectaron: {', '.join(presence['left'])}.")
+                self.on_message_received("Sistema", " ".join(parts))
+        elif kind == protocol.ROSTER:
+            _, _, data = protocol.parse_control(payload, 0)
+            users = json.loads(data)["users"]
+            if self.on_roster:
+                self.on_roster(users)
+            elif self.on_message_received:
+                self.on_message_received(
+                    "Sistema", f"Usuarios conectados: {', '.join(users) or 'ninguno'}."
+                )
+        elif kind == protocol.SEND_ACK:
+            # El servidor procesó un mensaje de la bandeja: ya no hace falta reenviarlo.
+            _, (key,), _ = protocol.parse_control(payload, 1)
+            if self.outbox is not None:
+                self.outbox.ack(key)
+        elif kind == protocol.DIRECT:
+            _, (alias,), data = protocol.parse_control(payload, 1)
+            callback = self.on_direct_message or self.on_message_received
+            if callback:
+                callback(alias, data.decode("utf-8"))
+        elif kind == protocol.FILE_ACK:
+            # El servidor ya retransmitió un fragmento: liberamos un hueco de la ventana.
+            _, (transfer_id, _seq), _ = protocol.parse_control(payload, 2)
+            window = self._windows.get(transfer_id)
+            if window:
+                window.release()
+        elif kind == protocol.FILE_OFFER:
+            _, (alias, transfer_id, _size, name), _ = protocol.parse_control(payload, 4)
+            try:
+                path = self._download_path(alias, name)
+                # Abrimos el archivo de destino: los fragmentos se escriben directamente en disco.
+                self._incoming[(alias, transfer_id)] = (open(path, "wb"), path)
+            except (ValueError, OSError) as e:
+                # Se ignoran los fragmentos de esta transferencia; la conexión sigue activa.
+                self._handle_error(f"No se puede recibir el archivo de {alias}: {e}")
+        elif kind == protocol.FILE_CHUNK:
+            _, (alias, transfer_id, _seq), data = protocol.parse_control(payload, 3)
+            entry = self._incoming.get((alias, transfer_id))
+            if entry:
+                try:
+                    entry[0].write(data)
+                except OSError as e:  # Disco lleno, p. ej.: sólo se pierde este archivo.
+                    self._discard_file(*self._incoming.pop((alias, transfer_id)))
+                    self._handle_error(f"Error guardando el archivo de {alias}: {e}")
+        elif kind == protocol.FILE_END:
+            _, (alias, transfer_id), _ = protocol.parse_control(payload, 2)
+            entry = self._incoming.pop((alias, transfer_id), None)
+            if entry:
+                try:
+                    entry[0].close()
+                except OSError as e:
+                    self._discard_file(*entry)
+                    self._handle_error(f"Error guardando el archivo de {alias}: {e}")
+                    return
+                if self.on_file_received:
+                    self.on_file_received(alias, entry[1])
+        elif kind == protocol.FILE_ABORT:
+            _, (alias, transfer_id), _ = protocol.parse_control(payload, 2)
+            entry = self._incoming.pop((alias, transfer_id), None)
+            if entry:
+                self._discard_file(*entry)
+                self._handle_error(f"Transferencia de {alias} cancelada.")
+            elif alias == self.username:
+                # El servidor canceló un archivo que enviamos: detenemos su hilo emisor.
+                window = self._windows.pop(transfer_id, None)
+                if window:
+                    window.release()  # Despierta al hilo si esperaba un hueco de la ventana.
+                    self._handle_error("El servidor canceló el envío del archivo.")
+
+    def _download_path(self, alias, name):
+        """
+        Calcula una ruta libre dentro de la carpeta de descargas para un archivo recibido.
+        """
+        os.makedirs(self.download_dir, exist_ok=True)
+        # Sólo usamos el nombre base (con "\\" también como separador, por si el emisor usa
+        # Windows) y limpiamos el alias para que el emisor no pueda escribir fuera de la carpeta.
+        name = os.path.basename(name.replace("\\", "/"))
+        base, ext = os.path.splitext(name if name not in ("", ".", "..") else "archivo")
+        prefix = _safe_filename(alias)
+        path = os.path.join(self.download_dir, f"{prefix}_{base}{ext}")
+        counter = 1
+        while os.path.exists(path):  # Evitamos sobrescribir archivos previos.
+            path = os.path.join(self.download_dir, f"{prefix}_{base}_{counter}{ext}")
+            counter += 1
+        folder = os.path.realpath(self.download_dir)
+        if os.path.dirname(os.path.realpath(path)) != folder:
+            raise ValueError(f"Nombre de archivo no válido recibido de {alias}: {name!r}")
+        return path
+
+    def _discard_file(self, file, path):
+        """
+        Cierra y elimina un archivo recibido parcialmente.
+        """
+        try:
+            file.close()
+        except OSError:
+            pass  # No se pudo volcar lo pendiente; el archivo se elimina igualmente.
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _discard_incoming(self):
+        """
+        Descarta todas las recepciones de archivos pendientes.
+        """
+        for entry in self._incoming.values():
+            self._discard_file(*entry)
+        self._incoming.clear()
+
+    def _send_raw(self, data):
+        """
+        Envía bytes ya codificados al servidor de forma segura entre hilos.
+        """
+        with self._send_lock:
+            self.sock.sendall(data)
 
     def send_message(self, message):
         """
         Envía un mensaje al servidor.
+
+        Con bandeja de salida, el mensaje se queda en ella hasta que el servidor confirma su
+        clave: si no hay conexión, o si la conexión se pierde antes de la confirmación, se
+        reenvía al reconectar (con `reconnect()` o con un cliente nuevo con el mismo alias).
+
+        :return: True si el mensaje salió hacia el servidor, False si quedó pendiente o se perdió.
         """
+        if self.outbox is not None:
+            # Con conexión no hace falta escribirlo en disco: se escribe si se pierde.
+            self.outbox.append(message, persist=not self.connected)
+            return self.connected and self._flush_outbox()
         try:
             if self.connected:  # Solo enviamos mensajes si estamos conectados.
-                # Creamos el encabezado con la longitud del mensaje.
-                header = f"{len(message):<{HEADER_SIZE}}".encode("utf-8")
                 # Codificamos el mensaje y lo enviamos junto con el encabezado.
-                self.sock.send(header + message.encode("utf-8"))
-            else:
-                # Si no estamos conectados, enviamos un error al callback.
-                self._handle_error("No está conectado al servidor")
+                self._send_raw(protocol.encode_frame(message))
+                return True
+            # Si no estamos conectados, enviamos un error al callback.
+            self._handle_error("No está conectado al servidor")
         except Exception as e:
             # Si ocurre un error al enviar el mensaje, lo manejamos con el callback.
             self._handle_error(f"Error enviando mensaje: {e}")
+        return False
+
+    def _flush_outbox(self):
+        """
+        Envía en una sola escritura los mensajes de la bandeja que aún no salieron por
+        esta conexión. Siguen en la bandeja hasta que el servidor confirma su clave.
+
+        Cada mensaje lleva su clave de idempotencia: si el envío se corta y se repite,
+        el servidor descarta los que ya había recibido.
+
+        :return: True si el envío no falló.
+        """
+        try:
+            self.outbox.flush(
+                lambda entries: self._send_raw(
+                    b"".join(
+                        protocol.encode_control(protocol.SEND, key, data=text.encode("utf-8"))
+                        for key, text in entries
+                    )
+                )
+            )
+            return True
+        except Exception as e:
+            self._handle_error(f"Error enviando mensajes pendientes: {e}")
+            self.outbox.persist()
+            return False
+
+    def send_messages(self, messages):
+        """
+        Envía varios mensajes al servidor en una sola escritura.
+
+        :param messages: Lista de mensajes de texto.
+        :return: True si se enviaron, False si no hay conexión o hubo un error.
+        """
+        try:
+            if self.connected:
+                # Codificamos todas las tramas y las enviamos juntas: una sola llamada al sistema.
+                self._send_raw(b"".join(protocol.encode_frame(m) for m in messages))
+                return True
+            self._handle_error("No está conectado al servidor")
+        except Exception as e:
+            self._handle_error(f"Error enviando mensajes: {e}")
+        return False
+
+    def send_direct_message(self, alias, message):
+        """
+        Envía un mensaje privado que el servidor entrega sólo al usuario `alias`.
+        """
+        try:
+            if self.connected:  # Solo enviamos mensajes si estamos conectados.
+                self._send_raw(
+                    protocol.encode_control(
+                        protocol.DIRECT, alias, data=message.encode("utf-8")
+                    )
+                )
+            else:
+                self._handle_error("No está conectado al servidor")
+        except Exception as e:
+            self._handle_error(f"Error enviando mensaje privado: {e}")
+
+    def request_roster(self):
+        """
+        Pide al servidor la lista de usuarios conectados; la respuesta llega a `on_roster`.
+        """
+        try:
+            if self.connected:
+                self._send_raw(protocol.encode_control(protocol.ROSTER))
+            else:
+                self._handle_error("No está conectado al servidor")
+        except Exception as e:
+            self._handle_error(f"Error pidiendo la lista de usuarios: {e}")
+
+    def send_file(self, path):
+        """
+        Envía un archivo al resto de usuarios en fragmentos de tamaño fijo.
+
+        El envío se hace en un hilo aparte; como mucho `protocol.FILE_WINDOW` fragmentos
+        quedan sin confirmar por el servidor, así el archivo nunca se carga completo en memoria.
+
+        :param path: Ruta del archivo que se enviará.
+        :return: Identificador de la transferencia, o None si no se pudo iniciar.
+        """
+        if not self.connected:
+            self._handle_error("No está conectado al servidor")
+            return None
+        transfer_id = uuid.uuid4().hex
+        self._windows[transfer_id] = threading.Semaphore(protocol.FILE_WINDOW)
+        threading.Thread(
+            target=self._send_file_worker, args=(path, transfer_id), daemon=True
+        ).start()
+        return transfer_id
+
+    def _send_file_worker(self, path, transfer_id):
+        """
+        Lee el archivo por fragmentos y los envía respetando la ventana de control de flujo.
+        """
+        window = self._windows[transfer_id]
+        try:
+            size = os.path.getsize(path)
+            name = os.path.basename(path).replace("|", "_")  # "|" separa los campos de la trama.
+            self._send_raw(
+                protocol.encode_control(protocol.FILE_OFFER, transfer_id, size, name)
+            )
+            with open(path, "rb") as file:
+                seq = 0
+                while True:
+                    chunk = file.read(protocol.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    # Esperamos a que el servidor confirme fragmentos anteriores.
+                    while not window.acquire(timeout=1):
+                        if not self.connected:
+                            return
+                    if self._windows.get(transfer_id) is not window:
+                        return  # El servidor canceló la transferencia (FILE_ABORT).
+                    self._send_raw(
+                        protocol.encode_control(
+                            protocol.FILE_CHUNK, transfer_id, seq, data=chunk
+                        )
+                    )
+                    seq += 1
+            self._send_raw(protocol.encode_control(protocol.FILE_END, transfer_id))
+        except Exception as e:
+            self._handle_error(f"Error enviando archivo: {e}")
+            if self.connected:
+                try:
+                    self._send_raw(
+                        protocol.encode_control(protocol.FILE_ABORT, transfer_id)
+                    )
+                except OSError:
+                    pass
+        finally:
+            self._windows.pop(transfer_id, None)
+
+    def drain(self, timeout=DRAIN_TIMEOUT):
+        """
+        Termina la sesión de forma ordenada: cierra el sentido de escritura y espera a que
+        el servidor, después de procesar todo lo recibido, cierre la conexión.
+
+        Si se cierra el socket con tramas del servidor aún sin leer, el sistema envía un
+        RST y el servidor puede descartar las últimas tramas que le enviamos.
+
+        :param timeout: Segundos máximos de espera.
+        :return: True si el servidor cerró la conexión antes del tiempo límite.
+        """
+        if not self.connected:
+            return False
+        self._closed = True  # Sin reconexiones: el cierre del servidor es la respuesta esperada.
+        try:
+            self.sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            return False
+        self.receive_thread.join(timeout)
+        return not self.receive_thread.is_alive()
 
     def close(self):
         """
         Cierra la conexión con el servidor.
         """
         self.connected = False  # Cambiamos el estado a desconectado.
+        self._closed = True  # Evita reconexiones automáticas.
+        if self.outbox is not None:
+            self.outbox.close()  # Guarda lo que quede sin confirmar para la próxima vez.
+        if self.sock is None:  # Nunca llegó a conectarse.
+            return
+        try:
+            # Cerramos ambos sentidos primero para desbloquear el hilo de recepción.
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # El socket ya estaba desconectado.
         try:
             self.sock.close()  # Cerramos el socket para liberar recursos.
         except Exception as e:
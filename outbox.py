@@ -0,0 +1,181 @@
+"""
+Bandeja de salida persistente del cliente: guarda los mensajes hasta que el servidor los
+confirma y reenvía todos juntos los pendientes al reconectar.
+"""
+import json  # Importamos json para el formato de cada registro.
+import os  # Importamos os para crear la carpeta y borrar el archivo ya confirmado.
+import threading  # Importamos threading para que el envío y los nuevos mensajes no se mezclen.
+import uuid  # Importamos uuid para las claves de idempotencia.
+
+try:
+    import fcntl  # Bloqueo del archivo en Linux y macOS.
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt  # Bloqueo del archivo en Windows.
+
+
+def _lock_file(path):
+    """
+    Abre y bloquea en exclusiva el archivo de bloqueo `path`. El sistema libera el
+    bloqueo si el proceso termina, aunque sea de forma abrupta.
+
+    :return: Archivo abierto que mantiene el bloqueo.
+    :raises OSError: Si otro proceso ya tiene el bloqueo.
+    """
+    file = open(path, "a+b")
+    try:
+        if fcntl:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        file.close()
+        raise OSError(f"Otro proceso está usando la bandeja de salida {path}")
+    return file
+
+
+class Outbox:
+    """
+    Almacén de sólo anexado (una línea JSON por registro) con los mensajes pendientes.
+
+    Cada mensaje lleva una clave de idempotencia que se genera al guardarlo. Un mensaje
+    sólo sale de la bandeja cuando el servidor confirma su clave (SEND_ACK); hasta
+    entonces se reenvía en cada reconexión y el servidor descarta los repetidos.
+
+    Registros del archivo: {"key", "text"} para un mensaje nuevo y {"ack"} para una
+    confirmación, que retira ese mensaje y todos los anteriores. Los mensajes enviados
+    con conexión pueden quedarse sólo en memoria y escribirse al perderla (`persist()`).
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: Ruta del archivo; se crea al guardar el primer mensaje. Con None la
+            bandeja sólo vive en memoria.
+        :raises OSError: Si otro proceso ya usa la misma bandeja.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._lock_file = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # Un solo proceso por archivo: otro podría enviar y retirar nuestros mensajes.
+            self._lock_file = _lock_file(path + ".lock")
+        self._entries = self._load()  # Pares (clave, texto) sin confirmar, en orden de envío.
+        self._sent = 0  # Cuántos de ellos ya se enviaron por la conexión actual.
+        self._written = len(self._entries)  # Cuántos de ellos (los primeros) están en el archivo.
+
+    def _load(self):
+        """Lee los mensajes que quedaron sin confirmar en una ejecución anterior."""
+        entries = []
+        if self.path is None:
+            return entries
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:  # Última línea a medias si el proceso se cortó al escribirla.
+                        continue
+                    if "ack" in record:
+                        entries = self._after(entries, record["ack"])
+                    else:
+                        entries.append((record["key"], record["text"]))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    @staticmethod
+    def _after(entries, key):
+        """Devuelve los mensajes posteriores a `key` (sin cambios si la clave no está)."""
+        for index, (entry_key, _) in enumerate(entries):
+            if entry_key == key:
+                return entries[index + 1 :]
+        return entries
+
+    def _write(self, *records):
+        """Añade registros al final del archivo."""
+        if self.path is None or not records:
+            return
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+
+    def _persist(self):
+        """Escribe en el archivo los mensajes que sólo estaban en memoria (sin tomar el cerrojo)."""
+        self._write(*({"key": key, "text": text} for key, text in self._entries[self._written :]))
+        self._written = len(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def append(self, text, persist=True):
+        """
+        Guarda un mensaje al final de la bandeja.
+
+        :param persist: Si es False, el mensaje sólo queda en memoria hasta que se llame a
+            `persist()` (p. ej. al perder la conexión) o lo confirme el servidor.
+        :return: Clave de idempotencia asignada.
+        """
+        key = uuid.uuid4().hex
+        with self._lock:
+            self._entries.append((key, text))
+            if persist:
+                self._persist()  # También los anteriores, para conservar el orden en el archivo.
+        return key
+
+    def persist(self):
+        """Escribe en el archivo los mensajes sin confirmar que sólo estaban en memoria."""
+        with self._lock:
+            self._persist()
+
+    def rewind(self):
+        """Marca todos los mensajes sin confirmar como no enviados (conexión nueva)."""
+        with self._lock:
+            self._sent = 0
+
+    def flush(self, send):
+        """
+        Envía con una sola llamada los mensajes que aún no salieron por esta conexión.
+
+        Mientras tanto no se pueden guardar mensajes nuevos, así nunca adelantan a los pendientes.
+
+        :param send: Función que recibe la lista de pares (clave, texto); si lanza una
+            excepción, se reenviarán en el próximo intento.
+        :return: Número de mensajes enviados.
+        """
+        with self._lock:
+            pending = self._entries[self._sent :]
+            if pending:
+                send(pending)
+                self._sent = len(self._entries)
+            return len(pending)
+
+    def ack(self, key):
+        """
+        Retira de la bandeja el mensaje confirmado por el servidor y los anteriores
+        (el servidor procesa los mensajes de una conexión en orden).
+        """
+        with self._lock:
+            remaining = self._after(self._entries, key)
+            removed = len(self._entries) - len(remaining)
+            if not removed:
+                return  # Confirmación repetida o de un mensaje ya retirado.
+            if removed < self._written:
+                # La clave está en el archivo: el registro retira al cargarlo lo anterior.
+                self._write({"ack": key})
+            elif self._written and self.path is not None:
+                try:
+                    os.remove(self.path)  # Todo lo escrito está confirmado: el archivo sobra.
+                except FileNotFoundError:
+                    pass
+            self._written = max(0, self._written - removed)
+            self._sent = max(0, self._sent - removed)
+            self._entries = remaining
+
+    def close(self):
+        """Guarda en el archivo lo que quede sin confirmar y libera la bandeja para otros procesos."""
+        with self._lock:
+            self._persist()
+            if self._lock_file:
+                self._lock_file.close()
+                self._lock_file = None
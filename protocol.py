@@ -0,0 +1,170 @@
+import socket  # Importamos socket para abrir conexiones TCP (IPv4/IPv6) y Unix.
+
+# Constantes compartidas por el servidor y el cliente.
+HEADER_SIZE = 10  # Tamaño del encabezado que indica la longitud (en bytes) de la trama.
+CONTROL_PREFIX = b"\x00"  # Byte inicial que distingue las tramas de control de los mensajes de texto.
+CHUNK_SIZE = 64 * 1024  # Tamaño de cada fragmento de archivo (64 KiB).
+FILE_WINDOW = 8  # Número máximo de fragmentos en vuelo por transferencia (ventana de control de flujo).
+MAX_FRAME_SIZE = 1024 * 1024  # Tamaño máximo aceptado para una trama (1 MiB).
+
+# Tipos de tramas de control para la transferencia de archivos.
+FILE_OFFER = b"FILE_OFFER"  # Anuncia un archivo nuevo: id, tamaño y nombre.
+FILE_CHUNK = b"FILE_CHUNK"  # Fragmento de archivo: id, número de secuencia y datos.
+FILE_ACK = b"FILE_ACK"  # Confirmación del servidor al emisor: libera un hueco de la ventana.
+FILE_END = b"FILE_END"  # Indica que la transferencia terminó correctamente.
+FILE_ABORT = b"FILE_ABORT"  # Indica que la transferencia se canceló.
+
+# Tipos de tramas de control para el saludo inicial y los mensajes directos.
+WELCOME = b"WELCOME"  # El servidor aceptó el alias del cliente.
+REJECT = b"REJECT"  # El servidor rechazó la conexión: motivo.
+DIRECT = b"DIRECT"  # Mensaje privado: alias de destino (o de origen, al entregarlo) y texto.
+RESTART = b"RESTART"  # El servidor se reinicia: espera máxima (ms) antes de reconectarse.
+PRESENCE = b"PRESENCE"  # Altas y bajas agrupadas: JSON {"joined": [...], "left": [...]}.
+ROSTER = b"ROSTER"  # Petición de la lista de usuarios; la respuesta lleva JSON {"users": [...]}.
+SEND = b"SEND"  # Mensaje con clave de idempotencia: clave y texto. El servidor descarta las claves repetidas.
+SEND_ACK = b"SEND_ACK"  # Confirmación del servidor de un mensaje SEND (nuevo o repetido): clave.
+
+# Encabezado especial con el que una sonda de salud abre la conexión en lugar del alias.
+# El servidor responde con una trama JSON de estado y cierra, sin pasar por el saludo del chat.
+PING_HEADER = (CONTROL_PREFIX + b"PING").ljust(HEADER_SIZE)
+
+UNIX_PREFIX = "unix:"  # Prefijo de las direcciones de sockets Unix, p. ej. "unix:/tmp/chat.sock".
+AF_UNIX = getattr(socket, "AF_UNIX", None)  # No existe en algunas compilaciones de Windows.
+
+
+def parse_endpoint(endpoint, default_port=5000):
+    """
+    Interpreta una dirección de escucha o de conexión.
+
+    Formatos admitidos: "unix:/ruta", "[::1]:5000" o "::1" (IPv6), "127.0.0.1:5000"
+    o "127.0.0.1" (IPv4).
+
+    :param endpoint: Dirección en texto.
+    :param default_port: Puerto que se usa si la dirección no lo indica.
+    :return: Tupla (familia de socket, dirección) lista para `bind` o `connect`.
+    :raises ValueError: Si la dirección es un socket Unix y la plataforma no los admite.
+    """
+    if endpoint.startswith(UNIX_PREFIX):
+        if AF_UNIX is None:
+            raise ValueError(f"Los sockets Unix no están disponibles en esta plataforma: {endpoint}")
+        return AF_UNIX, endpoint[len(UNIX_PREFIX) :]
+    if endpoint.startswith("["):  # IPv6 con puerto: [host]:puerto
+        host, _, port = endpoint[1:].partition("]")
+        return socket.AF_INET6, (host, int(port.lstrip(":") or default_port))
+    if endpoint.count(":") > 1:  # IPv6 sin puerto.
+        return socket.AF_INET6, (endpoint, default_port)
+    host, _, port = endpoint.partition(":")
+    return socket.AF_INET, (host, int(port or default_port))
+
+
+def open_connection(address, port, timeout=None):
+    """
+    Abre una conexión con el servidor por TCP (IPv4 o IPv6) o por un socket Unix.
+
+    :param address: Host, IP o "unix:/ruta".
+    :param port: Puerto TCP (se ignora para sockets Unix).
+    :param timeout: Tiempo máximo de espera al conectar.
+    :return: Socket conectado.
+    """
+    if address.startswith(UNIX_PREFIX):
+        if AF_UNIX is None:
+            raise OSError(f"Los sockets Unix no están disponibles en esta plataforma: {address}")
+        sock = socket.socket(AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(address[len(UNIX_PREFIX) :])
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    return socket.create_connection((address, port), timeout=timeout)
+
+
+def encode_frame(payload):
+    """
+    Antepone el encabezado de longitud a una trama.
+
+    :param payload: Contenido de la trama (str o bytes).
+    :return: Bytes listos para enviarse por el socket.
+    """
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")  # La longitud se mide en bytes, no en caracteres.
+    header = f"{len(payload):<{HEADER_SIZE}}".encode("utf-8")
+    return header + payload
+
+
+def encode_control(kind, *fields, data=b""):
+    """
+    Construye una trama de control con el formato `\\x00TIPO|campo1|campo2|...|datos`.
+
+    :param kind: Tipo de trama (una de las constantes FILE_*).
+    :param fields: Campos de texto que acompañan a la trama.
+    :param data: Datos binarios opcionales que se añaden al final.
+    :return: Bytes de la trama completa, con encabezado.
+    """
+    parts = [kind] + [str(field).encode("utf-8") for field in fields]
+    return encode_frame(CONTROL_PREFIX + b"|".join(parts) + b"|" + data)
+
+
+def is_control(payload):
+    """Indica si una trama recibida es de control."""
+    return payload[:1] == CONTROL_PREFIX
+
+
+def parse_control(payload, field_count):
+    """
+    Separa una trama de control en su tipo, sus campos y los datos finales.
+
+    :param payload: Trama recibida (sin encabezado).
+    :param field_count: Número de campos de texto que se esperan tras el tipo.
+    :return: Tupla (tipo, lista de campos, datos binarios restantes).
+    """
+    parts = payload[1:].split(b"|", field_count + 1)
+    kind = parts[0]
+    fields = [field.decode("utf-8") for field in parts[1 : field_count + 1]]
+    data = parts[field_count + 1] if len(parts) > field_count + 1 else b""
+    return kind, fields, data
+
+
+def control_kind(payload):
+    """Devuelve el tipo de una trama de control sin decodificar el resto."""
+    return payload[1:].split(b"|", 1)[0]
+
+
+def recv_exact(sock, length):
+    """
+    Lee exactamente `length` bytes del socket.
+
+    :return: Los bytes leídos, o b"" si la conexión se cerró antes de completarlos.
+    """
+    chunks = []
+    remaining = length
+    while remaining > 0:
+        chunk = sock.recv(min(remaining, CHUNK_SIZE))
+        if not chunk:  # El otro extremo cerró la conexión.
+            return b""
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock, max_size=MAX_FRAME_SIZE):
+    """
+    Recibe una trama completa (encabezado + contenido).
+
+    :param sock: Socket del que se lee.
+    :param max_size: Tamaño máximo permitido; tramas mayores provocan un error.
+    :return: El contenido de la trama en bytes, o None si la conexión se cerró.
+    """
+    data_header = recv_exact(sock, HEADER_SIZE)
+    if not data_header:
+        return None
+    length = int(data_header.strip())
+    if length > max_size:
+        raise ValueError(f"Trama de {length} bytes supera el máximo de {max_size}.")
+    if length == 0:
+        return b""
+    data = recv_exact(sock, length)
+    if not data:
+        return None
+    return data
@@ -0,0 +1,205 @@
+"""
+Reproduce contra un servidor local el tráfico grabado con la captura del servidor.
+
+Uso:
+    python server_manager.py --capture=trafico.cap           # Graba el tráfico entrante.
+    python replay.py trafico.cap                              # Reproduce a velocidad real (1x).
+    python replay.py trafico.cap --speed 10                   # 10 veces más rápido.
+    python replay.py trafico.cap --speed max --port 5001      # Lo más rápido posible.
+
+Cada conexión grabada se abre con su alias y sus tramas se envían en el mismo orden y,
+salvo con `--speed max`, respetando los tiempos originales divididos por la velocidad.
+Cada conexión tiene su propio hilo emisor: si el servidor frena a un cliente, los demás
+siguen a su ritmo. Las respuestas del servidor se leen y descartan.
+
+El tiempo se detiene cuando el servidor ha procesado todo: cada conexión cierra su
+sentido de escritura y espera a que el servidor cierre la conexión.
+"""
+import argparse  # Importamos argparse para leer los argumentos de la línea de comandos.
+import queue  # Importamos queue para pasar las tramas al hilo de cada conexión.
+import socket  # Importamos socket para cerrar las conexiones reproducidas.
+import threading  # Importamos threading para el emisor y el lector de cada conexión.
+import time  # Importamos time para respetar los tiempos de la captura.
+
+import capture  # Formato del archivo de captura.
+import protocol  # Funciones del protocolo de tramas.
+
+QUEUE_SIZE = 1024  # Tramas leídas por adelantado para cada conexión.
+CLOSE_TIMEOUT = 300  # Segundos máximos de espera a que el servidor procese todo y cierre cada conexión.
+
+
+class _ReplayConnection:
+    """
+    Conexión reproducida: un hilo envía sus tramas grabadas y otro descarta lo que recibe.
+    """
+
+    def __init__(self, host, port, alias, conn_id, opened_at, clock):
+        """
+        :param opened_at: Nanosegundos desde el inicio de la captura en que se abrió.
+        :param clock: Función que devuelve el instante (s) de la reproducción en que
+            debe ocurrir un tiempo de la captura, o None para no esperar.
+        """
+        self.host = host
+        self.port = port
+        self.alias = alias
+        self.conn_id = conn_id
+        self.sock = None
+        self.error = None  # Motivo por el que no se pudo reproducir la conexión.
+        self.frames = 0  # Tramas enviadas.
+        self.sent = 0  # Bytes enviados (sin encabezados).
+        self.received = 0  # Bytes recibidos del servidor.
+        self._clock = clock
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)  # Pares (tiempo, trama); None al cerrar.
+        self._queue.put((opened_at, None))  # El primer elemento marca el momento de abrirla.
+        self._sender = threading.Thread(target=self._send_loop, daemon=True)
+        self._reader = threading.Thread(target=self._drain, daemon=True)
+        self._sender.start()
+
+    def put(self, elapsed, payload):
+        """Encola una trama grabada en el instante `elapsed` (ns)."""
+        self._queue.put((elapsed, payload))
+
+    def finish(self):
+        """Indica que la conexión se cerró en la captura."""
+        self._queue.put(None)
+
+    def join(self):
+        """Espera a que se envíe todo y el servidor cierre la conexión."""
+        self._sender.join()
+
+    def _wait(self, elapsed):
+        """Duerme hasta el instante equivalente de la captura."""
+        deadline = self._clock(elapsed)
+        if deadline is not None:
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _connect(self, alias):
+        """Abre la conexión y envía el alias. Devuelve True si el servidor lo aceptó."""
+        self.sock = protocol.open_connection(self.host, self.port)
+        self.sock.sendall(protocol.encode_frame(alias))
+        reply = protocol.recv_frame(self.sock)
+        if reply is not None and protocol.control_kind(reply) == protocol.WELCOME:
+            return True
+        self.sock.close()
+        self.sock = None
+        return False
+
+    def _open(self):
+        """
+        Conecta con el alias grabado o, si sigue en uso (p. ej. una reconexión muy
+        rápida), con uno derivado. Lanza ConnectionError si el servidor rechaza ambos.
+        """
+        if self._connect(self.alias):
+            return
+        self.alias = f"{self.alias}-{self.conn_id}"
+        if not self._connect(self.alias):
+            raise ConnectionError(f"el servidor rechazó los alias de la conexión {self.conn_id}")
+
+    def _send_loop(self):
+        """Abre la conexión, envía las tramas a su tiempo y cierra de forma ordenada."""
+        item = self._queue.get()
+        try:
+            self._wait(item[0])
+            self._open()
+            self._reader.start()
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                elapsed, payload = item
+                self._wait(elapsed)
+                self.sock.sendall(protocol.encode_frame(payload))
+                self.frames += 1
+                self.sent += len(payload)
+            # Barrera: tras el cierre de escritura, el servidor procesa lo recibido y cierra.
+            self.sock.shutdown(socket.SHUT_WR)
+            self._reader.join(CLOSE_TIMEOUT)
+            if self._reader.is_alive():
+                self.error = "el servidor no cerró la conexión a tiempo"
+        except OSError as e:  # Incluye ConnectionError: la conexión no se pudo reproducir.
+            self.error = str(e)
+            while item is not None:  # Descartamos el resto para no bloquear al lector de la captura.
+                item = self._queue.get()
+        finally:
+            if self.sock is not None:
+                self.sock.close()
+
+    def _drain(self):
+        """Lee y descarta las tramas del servidor hasta que cierre la conexión."""
+        try:
+            while True:
+                data = self.sock.recv(protocol.CHUNK_SIZE)
+                if not data:
+                    return
+                self.received += len(data)
+        except OSError:
+            return
+
+
+def replay(path, host="127.0.0.1", port=5000, speed=1.0, on_error=None):
+    """
+    Reproduce una captura.
+
+    :param path: Archivo de captura.
+    :param host: Dirección del servidor (admite "unix:/ruta").
+    :param port: Puerto del servidor.
+    :param speed: Factor de velocidad; None para enviar lo más rápido posible.
+    :param on_error: Callback para las conexiones que no se pudieron reproducir.
+    :return: Diccionario con estadísticas de la reproducción.
+    """
+    start = time.perf_counter()
+
+    def clock(elapsed):
+        return start + elapsed / 1e9 / speed if speed else None
+
+    connections = {}  # Id de conexión en la captura -> conexión reproducida.
+    replayed = []
+    for kind, conn_id, elapsed, data in capture.read_capture(path):
+        if kind == capture.OPEN:
+            connection = _ReplayConnection(host, port, data.decode("utf-8"), conn_id, elapsed, clock)
+            connections[conn_id] = connection
+            replayed.append(connection)
+        elif kind == capture.FRAME and conn_id in connections:
+            connections[conn_id].put(elapsed, data)
+        elif kind == capture.CLOSE and conn_id in connections:
+            connections.pop(conn_id).finish()
+    for connection in connections.values():  # Conexiones que seguían abiertas al final de la captura.
+        connection.finish()
+    for connection in replayed:
+        connection.join()
+    duration = time.perf_counter() - start
+
+    failed = [c for c in replayed if c.error]
+    for connection in failed:
+        if on_error:
+            on_error(f"Conexión {connection.conn_id} ({connection.alias}): {connection.error}")
+    frames = sum(c.frames for c in replayed)
+    return {
+        "duration_s": round(duration, 3),
+        "connections": len(replayed),
+        "failed": len(failed),
+        "frames": frames,
+        "frames_per_s": round(frames / duration, 1) if duration else None,
+        "sent_bytes": sum(c.sent for c in replayed),
+        "received_bytes": sum(c.received for c in replayed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce una captura de tráfico del chat.")
+    parser.add_argument("capture", help="Archivo de captura.")
+    parser.add_argument("--host", default="127.0.0.1", help="Dirección del servidor.")
+    parser.add_argument("--port", type=int, default=5000, help="Puerto del servidor.")
+    parser.add_argument("--speed", default="1", help="Factor de velocidad (1, 2, 10...) o 'max'.")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    stats = replay(args.capture, args.host, args.port, speed, on_error=lambda m: print(f"[ERROR] {m}"))
+    for key, value in stats.items():
+        print(f"{key:<16} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Pasarela entre dispositivos seriales y el servidor de chat TCP.
+
+Cada puerto serial se conecta al servidor como un cliente (`client.Client`) con su propio
+alias. Las líneas que envía el dispositivo (el mismo protocolo de `chat_serial.SerialChat`:
+texto UTF-8 terminado en "\\n") se publican en el chat, y los mensajes del chat se escriben
+en el puerto como "alias: mensaje\\n".
+
+Uso:
+    python serial_gateway.py /dev/ttyUSB0=campo1 /dev/ttyUSB1=campo2 --host 127.0.0.1 --port 5000
+
+Acepta cualquier URL de pyserial, por lo que puede probarse con pares pty
+(`socat -d -d pty,raw,echo=0 pty,raw,echo=0`) o con `loop://` (que devuelve lo escrito).
+"""
+import argparse  # Importamos argparse para leer los argumentos de la línea de comandos.
+import os  # Importamos os para derivar alias a partir del nombre del puerto.
+import queue  # Importamos queue para la cola acotada hacia el puerto serial.
+import threading  # Importamos threading para atender cada sentido en su propio hilo.
+import time  # Importamos time para los intervalos de agrupación y reintento.
+from collections import deque  # Cola de líneas pendientes de enviar al chat.
+
+import serial  # pyserial: acceso a los puertos seriales.
+
+from client import Client  # Cliente TCP del chat.
+
+BAUDRATE = 9600  # Velocidad por defecto, la misma que usa chat_serial.
+BATCH_INTERVAL = 0.05  # Segundos máximos que una línea espera a juntarse con otras.
+BATCH_MAX = 32  # Líneas máximas por escritura.
+SERIAL_QUEUE_SIZE = 256  # Mensajes del chat en espera de escribirse en el puerto serial.
+BACKPRESSURE_TIMEOUT = 1  # Segundos que se frena la recepción del chat cuando la cola serial está llena.
+PENDING_MAX = 1024  # Líneas del dispositivo que se guardan mientras el servidor no está disponible.
+RETRY_INTERVAL = 2  # Segundos entre intentos de reabrir el puerto o reconectar al servidor.
+
+
+class SerialBridge:
+    """
+    Puente bidireccional entre un puerto serial y una sesión del chat.
+    """
+
+    def __init__(self, url, alias, host="127.0.0.1", port=5000, baudrate=BAUDRATE, on_error=None):
+        """
+        :param url: Puerto o URL de pyserial (p. ej. "/dev/ttyUSB0", "COM3" o "loop://").
+        :param alias: Alias con el que el dispositivo aparece en el chat.
+        :param host: Dirección del servidor de chat.
+        :param port: Puerto del servidor de chat.
+        :param baudrate: Velocidad del puerto serial.
+        :param on_error: Callback para manejar errores.
+        """
+        self.url = url
+        self.alias = alias
+        self.host = host
+        self.port = port
+        self.baudrate = baudrate
+        self.on_error = on_error
+        self.client = None  # Sesión del chat; se crea en start().
+        self.dropped = 0  # Mensajes del chat descartados porque el puerto serial no daba abasto.
+        self._serial = None  # Conexión serial actual (None mientras está cerrada).
+        self._serial_lock = threading.Lock()  # Evita que dos hilos reabran el puerto a la vez.
+        self._pending = deque(maxlen=PENDING_MAX)  # Líneas del dispositivo hacia el chat.
+        self._pending_cond = threading.Condition()  # Avisa al hilo emisor de líneas nuevas.
+        self._to_serial = queue.Queue(maxsize=SERIAL_QUEUE_SIZE)  # Mensajes del chat hacia el dispositivo.
+        self._stop = threading.Event()  # Se activa para detener todos los hilos.
+
+    def start(self):
+        """Conecta con el servidor e inicia los hilos de ambos sentidos."""
+        self.client = Client(
+            self.host,
+            self.alias,
+            port=self.port,
+            on_message_received=self._on_chat_message,
+            on_direct_message=self._on_chat_message,
+            on_error=self._handle_error,
+        )
+        for target in (self._serial_reader, self._serial_writer, self._chat_sender):
+            threading.Thread(target=target, daemon=True).start()
+
+    def stop(self):
+        """Detiene los hilos y cierra el puerto y la sesión."""
+        self._stop.set()
+        with self._pending_cond:
+            self._pending_cond.notify_all()
+        if self.client:
+            self.client.close()
+        self._close_serial()
+
+    # --- Puerto serial ---
+    def _get_serial(self):
+        """Devuelve el puerto abierto, reabriéndolo si hace falta (None si no se pudo)."""
+        with self._serial_lock:
+            if self._serial is None and not self._stop.is_set():
+                try:
+                    self._serial = serial.serial_for_url(
+                        self.url, baudrate=self.baudrate, timeout=BATCH_INTERVAL
+                    )
+                except (serial.SerialException, ValueError) as e:
+                    self._handle_error(f"No se pudo abrir {self.url}: {e}")
+            return self._serial
+
+    def _close_serial(self):
+        """Cierra el puerto para que se reabra en el próximo intento."""
+        with self._serial_lock:
+            if self._serial is not None:
+                try:
+                    self._serial.close()
+                except serial.SerialException:
+                    pass
+                self._serial = None
+
+    def _serial_reader(self):
+        """Lee líneas del dispositivo y las deja listas para enviarlas al chat."""
+        partial = b""  # Parte de una línea que llegó sin su "\n".
+        while not self._stop.is_set():
+            conn = self._get_serial()
+            if conn is None:
+                time.sleep(RETRY_INTERVAL)
+                continue
+            try:
+                data = conn.read_until(b"\n")  # Vuelve al agotar el timeout aunque no haya "\n".
+            except (serial.SerialException, OSError, TypeError) as e:
+                # TypeError: pyserial lo lanza si otro hilo cierra el puerto durante la lectura.
+                self._handle_error(f"Error leyendo de {self.url}: {e}")
+                self._close_serial()
+                continue
+            if not data:
+                continue
+            partial += data
+            if not partial.endswith(b"\n"):
+                continue
+            line = partial.decode("utf-8", errors="replace").strip()
+            partial = b""
+            if line:
+                with self._pending_cond:
+                    self._pending.append(line)  # Si el chat lleva caído mucho, se pierden las más antiguas.
+                    self._pending_cond.notify()
+
+    def _serial_writer(self):
+        """Escribe en el dispositivo los mensajes del chat, agrupados en una sola escritura."""
+        while not self._stop.is_set():
+            try:
+                lines = [self._to_serial.get(timeout=RETRY_INTERVAL)]
+            except queue.Empty:
+                continue
+            while len(lines) < BATCH_MAX:  # Juntamos lo que ya esté esperando.
+                try:
+                    lines.append(self._to_serial.get_nowait())
+                except queue.Empty:
+                    break
+            data = "".join(lines).encode("utf-8")
+            while not self._stop.is_set():
+                conn = self._get_serial()
+                if conn is None:
+                    time.sleep(RETRY_INTERVAL)
+                    continue
+                try:
+                    conn.write(data)  # Bloquea al ritmo del puerto: el resto espera en la cola.
+                    break
+                except (serial.SerialException, OSError) as e:
+                    self._handle_error(f"Error escribiendo en {self.url}: {e}")
+                    self._close_serial()
+
+    def _on_chat_message(self, alias, message):
+        """
+        Encola un mensaje del chat hacia el dispositivo.
+
+        Si el puerto serial es más lento que el chat, la cola se llena: primero se frena
+        la recepción (y con ella el envío del servidor) y, si sigue llena, se descarta el
+        mensaje más antiguo para que la memoria no crezca sin límite.
+        """
+        line = f"{alias}: {message}".replace("\n", " ") + "\n"  # Una línea por mensaje.
+        try:
+            self._to_serial.put(line, timeout=BACKPRESSURE_TIMEOUT)
+        except queue.Full:
+            try:
+                self._to_serial.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            self._to_serial.put_nowait(line)
+
+    # --- Servidor de chat ---
+    def _chat_sender(self):
+        """Envía al chat las líneas del dispositivo por lotes y reconecta si hace falta."""
+        while not self._stop.is_set():
+            if not self.client.connected:
+                if not self.client.reconnect():
+                    time.sleep(RETRY_INTERVAL)
+                continue
+            with self._pending_cond:
+                if not self._pending:
+                    self._pending_cond.wait(timeout=RETRY_INTERVAL)
+                    continue
+            time.sleep(BATCH_INTERVAL)  # Deja que se acumulen más líneas en el mismo lote.
+            with self._pending_cond:
+                batch = [self._pending.popleft() for _ in range(min(BATCH_MAX, len(self._pending)))]
+            if not self.client.send_messages(batch):
+                # No se pudo enviar: devolvemos el lote al principio para reintentarlo.
+                with self._pending_cond:
+                    self._pending.extendleft(reversed(batch))
+
+    def _handle_error(self, error_message):
+        """Maneja errores y los pasa al callback correspondiente."""
+        if self.on_error:
+            self.on_error(f"[{self.alias}] {error_message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pasarela entre puertos seriales y el chat TCP.")
+    parser.add_argument("ports", nargs="+", help="Puertos seriales, opcionalmente PUERTO=ALIAS.")
+    parser.add_argument("--host", default="127.0.0.1", help="Dirección del servidor de chat.")
+    parser.add_argument("--port", type=int, default=5000, help="Puerto del servidor de chat.")
+    parser.add_argument("--baudrate", type=int, default=BAUDRATE, help="Velocidad de los puertos.")
+    args = parser.parse_args()
+
+    bridges = []
+    for spec in args.ports:
+        url, _, alias = spec.partition("=")
+        alias = alias or f"serial-{os.path.basename(url.rstrip('/')) or url}"
+        bridge = SerialBridge(
+            url, alias, args.host, args.port, args.baudrate, on_error=lambda m: print(f"[ERROR] {m}")
+        )
+        bridge.start()
+        bridges.append(bridge)
+        print(f"[INFO] {url} conectado al chat como {alias}.")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("[INFO] Deteniendo pasarela...")
+    finally:
+        for bridge in bridges:
+            bridge.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,269 @@
+import os  # Importamos os para eliminar sockets Unix antiguos.
+import json  # Importamos json para responder a las sondas de salud.
+import selectors  # Importamos selectors para esperar conexiones sin bloquear el cierre.
 import socket  # Importamos el módulo para trabajar con sockets.
+import stat  # Importamos stat para comprobar que una ruta Unix es de verdad un socket.
 import threading  # Importamos threading para manejar múltiples conexiones simultáneamente.
+import time  # Importamos time para medir la tasa de mensajes de cada cliente.
+from collections import OrderedDict, deque  # Colas de salida y claves de mensajes ya vistas.
+
+import protocol  # Funciones y constantes compartidas del protocolo de tramas.
+from capture import CaptureWriter  # Grabación opcional del tráfico entrante.
 
 # Constantes para definir el host, puerto y tamaño del encabezado.
 HOST = "127.0.0.1"  # Dirección IP en la que el servidor escuchará (localhost).
 PORT = 5000  # Puerto en el que el servidor estará disponible.
-HEADER_SIZE = 10  # Tamaño del encabezado para definir la longitud de los mensajes.
+HEADER_SIZE = protocol.HEADER_SIZE  # Tamaño del encabezado para definir la longitud de los mensajes.
+MESSAGE_RATE = 50  # Mensajes por segundo permitidos a cada cliente.
+MESSAGE_BURST = 100  # Ráfaga máxima de mensajes que un cliente puede enviar de golpe.
+BYTE_RATE = 4 * 1024 * 1024  # Bytes por segundo permitidos a cada cliente.
+BYTE_BURST = 4 * 1024 * 1024  # Ráfaga máxima de bytes.
+FAIR_QUANTUM = 16 * 1024  # Bytes de retransmisión que recibe cada remitente por turno.
+MAX_PENDING_JOBS = 64  # Tramas pendientes de retransmitir por remitente antes de frenar su lectura.
+ACCEPT_POLL = 0.5  # Segundos entre comprobaciones de la bandera de parada al aceptar conexiones.
+DRAIN_TIMEOUT = 5  # Segundos máximos para vaciar las colas durante un cierre ordenado.
+RECONNECT_JITTER_MS = 3000  # Ventana (ms) en la que los clientes reparten su reconexión tras un reinicio.
+PRESENCE_WINDOW = 0.5  # Segundos durante los que se agrupan las altas y bajas en una sola trama.
+PRESENCE_MAX_ROOM = 500  # Con más clientes que este límite no se difunden altas ni bajas.
+SESSION_QUEUE_MAX = 8 * 1024 * 1024  # Bytes pendientes de enviar a un cliente antes de desconectarlo por lento.
+SEEN_KEYS_MAX = 65536  # Claves de idempotencia recordadas para descartar mensajes repetidos.
+
+
+class _TokenBucket:
+    """
+    Cubo de fichas para limitar la tasa de un cliente.
+
+    Las fichas pueden quedar en negativo: así una trama mayor que la ráfaga se acepta,
+    pero el cliente debe esperar proporcionalmente antes de la siguiente.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate  # Fichas que se recuperan por segundo.
+        self.capacity = capacity  # Máximo de fichas acumulables.
+        self.tokens = capacity  # Fichas disponibles.
+        self.timestamp = time.monotonic()  # Última actualización.
+
+    def consume(self, amount):
+        """
+        Descuenta `amount` fichas.
+
+        :return: Segundos que hay que esperar para volver a estar dentro de la tasa.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class _FairScheduler:
+    """
+    Planificador de retransmisiones por turno con déficit (Deficit Round Robin).
+
+    Cada remitente tiene su propia cola de trabajos; en cada turno recibe `quantum` bytes
+    de crédito y sólo se ejecutan los trabajos que caben en él. Un cliente ruidoso no puede
+    acaparar la retransmisión: los demás remitentes siempre tienen su turno.
+    """
+
+    def __init__(self, quantum, max_pending, on_error):
+        self.quantum = quantum  # Crédito en bytes por turno.
+        self.max_pending = max_pending  # Trabajos pendientes máximos por remitente.
+        self._on_error = on_error  # Función para reportar errores de los trabajos.
+        self._queues = {}  # Remitente -> cola de trabajos (coste, función).
+        self._deficit = {}  # Remitente -> crédito acumulado.
+        self._active = deque()  # Remitentes con trabajos pendientes, en orden de turno.
+        self._running = False  # Indica si hay un lote de trabajos ejecutándose.
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, key, cost, job):
+        """
+        Encola un trabajo de retransmisión para el remitente `key`.
+
+        Si el remitente ya tiene demasiados trabajos pendientes, se bloquea al hilo lector
+        hasta que haya hueco (el control de flujo de TCP frena entonces al cliente).
+        """
+        with self._cond:
+            while len(self._queues.get(key, ())) >= self.max_pending:
+                self._cond.wait()
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+                self._deficit[key] = 0
+                self._active.append(key)
+            queue.append((cost, job))
+            self._cond.notify_all()
+
+    def pending(self):
+        """Devuelve el número de trabajos de retransmisión en espera."""
+        with self._cond:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def wait_idle(self, timeout):
+        """
+        Espera a que no queden trabajos pendientes ni en ejecución.
+
+        :return: True si el planificador quedó vacío antes del tiempo límite.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._active and not self._running, timeout
+            )
+
+    def _run(self):
+        """Ejecuta los trabajos repartiendo los turnos entre remitentes."""
+        while True:
+            with self._cond:
+                while not self._active:
+                    self._cond.wait()
+                key = self._active.popleft()
+                queue = self._queues[key]
+                self._deficit[key] += self.quantum
+                batch = []
+                while queue and queue[0][0] <= self._deficit[key]:
+                    cost, job = queue.popleft()
+                    self._deficit[key] -= cost
+                    batch.append(job)
+                if queue:
+                    self._active.append(key)  # Vuelve al final de la ronda.
+                else:
+                    # Un remitente inactivo no conserva crédito para la siguiente ráfaga.
+                    del self._queues[key]
+                    del self._deficit[key]
+                self._running = True
+                self._cond.notify_all()  # Despierta a los lectores bloqueados en submit.
+            for job in batch:
+                try:
+                    job()
+                except Exception as e:
+                    self._on_error(f"Error al retransmitir mensaje: {e}")
+            with self._cond:
+                self._running = False
+                self._cond.notify_all()
+
+
+class _ClientSession:
+    """
+    Cola de salida de un cliente conectado.
+
+    Cada sesión tiene un hilo escritor propio: los mensajes de chat y de control van
+    por una cola prioritaria y los fragmentos de archivo por una cola de datos masivos,
+    de modo que una transferencia grande nunca retrasa el tráfico del chat.
+
+    Entre las dos colas no pueden acumularse más de SESSION_QUEUE_MAX bytes: un cliente
+    que no lee lo que se le envía se desconecta en lugar de hacer crecer la memoria.
+    """
+
+    def __init__(self, conn, addr, alias, on_error):
+        self.conn = conn  # Socket del cliente.
+        self.addr = addr  # Dirección del cliente.
+        self.alias = alias  # Alias del cliente.
+        self._on_error = on_error  # Función para reportar errores de escritura.
+        self._priority = deque()  # Tramas de chat y control (se envían primero).
+        self._bulk = deque()  # Tramas de archivos: pares (datos, callback al enviarse).
+        self._queued = 0  # Bytes encolados en ambas colas.
+        self._cond = threading.Condition()  # Sincroniza productores y el hilo escritor.
+        self._closed = False  # Bandera para detener el hilo escritor.
+        self._sending = False  # Indica si el hilo escritor está enviando una trama.
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def send(self, data):
+        """Encola una trama prioritaria (chat o control)."""
+        with self._cond:
+            if self._closed:
+                return
+            if self._queued + len(data) <= SESSION_QUEUE_MAX:
+                self._priority.append(data)
+                self._queued += len(data)
+                self._cond.notify_all()
+                return
+        self._drop_slow_reader()
+
+    def send_bulk(self, data, on_sent=None):
+        """
+        Encola una trama de datos masivos.
+
+        :param data: Trama ya codificada.
+        :param on_sent: Callback que se llama cuando la trama sale del servidor
+            (o se descarta porque el cliente se desconectó).
+        """
+        with self._cond:
+            closed = self._closed
+            if not closed and self._queued + len(data) <= SESSION_QUEUE_MAX:
+                self._bulk.append((data, on_sent))
+                self._queued += len(data)
+                self._cond.notify_all()
+                return
+        if not closed:
+            self._drop_slow_reader()
+        if on_sent:  # La trama no se enviará: liberamos el hueco de inmediato.
+            on_sent()
+
+    def _drop_slow_reader(self):
+        """Desconecta a un cliente cuya cola de salida superó SESSION_QUEUE_MAX."""
+        self._on_error(f"{self.alias} no lee sus mensajes; se cierra su conexión.")
+        self.close()
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)  # El hilo lector terminará la desconexión.
+        except OSError:
+            pass
+
+    def flush(self, timeout):
+        """
+        Espera a que el hilo escritor envíe todas las tramas encoladas.
+
+        :return: True si las colas quedaron vacías antes del tiempo límite.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._closed
+                or (not self._priority and not self._bulk and not self._sending),
+                timeout,
+            )
+
+    def close(self):
+        """Detiene el hilo escritor y libera las tramas pendientes."""
+        with self._cond:
+            self._closed = True
+            pending = list(self._bulk)
+            self._priority.clear()
+            self._bulk.clear()
+            self._queued = 0
+            self._cond.notify_all()
+        for _, on_sent in pending:
+            if on_sent:
+                on_sent()
+
+    def _write_loop(self):
+        """Envía las tramas encoladas, dando prioridad al tráfico del chat."""
+        while True:
+            with self._cond:
+                while not self._priority and not self._bulk and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                if self._priority:
+                    # Agrupamos todas las tramas prioritarias pendientes en una sola escritura.
+                    data = b"".join(self._priority)
+                    self._priority.clear()
+                    on_sent = None
+                else:
+                    data, on_sent = self._bulk.popleft()
+                self._queued -= len(data)
+                self._sending = True
+            try:
+                self.conn.sendall(data)
+            except OSError as e:
+                if not self._closed:  # Si ya se cerró la sesión, el error es esperado.
+                    self._on_error(f"Error al enviar datos a {self.alias}: {e}")
+                self.close()
+            finally:
+                if on_sent:
+                    on_sent()
+                with self._cond:
+                    self._sending = False
+                    self._cond.notify_all()  # Avisa a quien espera en flush().
 
 
 # Definimos la clase principal que maneja el servidor.
@@ -15,50 +274,241 @@ class Server:
         on_client_disconnected=None,  # Callback para manejar eventos de desconexión.
         on_message_received=None,  # Callback para manejar mensajes recibidos.
         on_error=None,  # Callback para manejar errores.
+        message_rate=MESSAGE_RATE,  # Mensajes por segundo por cliente (None desactiva el límite).
+        byte_rate=BYTE_RATE,  # Bytes por segundo por cliente (None desactiva el límite).
+        sock=None,  # Socket(s) de escucha heredado(s) de otro proceso (reinicio en caliente).
+        presence_max_room=PRESENCE_MAX_ROOM,  # Tamaño de sala a partir del cual no se avisan altas/bajas.
+        host=HOST,  # Dirección IP en la que escucha el servidor.
+        port=PORT,  # Puerto en el que escucha el servidor.
+        endpoints=None,  # Direcciones de escucha adicionales, p. ej. "[::1]:5000" o "unix:/tmp/chat.sock".
+        capture_path=None,  # Archivo donde grabar todas las tramas recibidas (ver replay.py).
     ):
         """
-        Constructor del servidor. Configura las variables y crea el socket.
+        Constructor del servidor. Configura las variables y crea los sockets de escucha.
+
+        El servidor escucha en `host:port` y en cada dirección de `endpoints` a la vez;
+        los clientes del mismo equipo pueden usar un socket Unix y evitar la pila TCP.
         """
         self.connections = []  # Lista para almacenar todas las conexiones activas.
         self.aliases = (
             {}
         )  # Diccionario para asociar conexiones con alias de los clientes.
+        self.sessions = {}  # Diccionario que asocia cada conexión con su sesión de salida.
+        self.alias_index = {}  # Índice alias -> sesión para entregar mensajes directos en O(1).
+        self.transfers = {}  # Transferencias de archivos activas: (conexión, id) -> destinatarios.
+        self._unacked = {}  # Fragmentos sin confirmar por transferencia: (conexión, id) -> cantidad.
+        self._seen_keys = OrderedDict()  # Claves de idempotencia recientes, de la más antigua a la más nueva.
+        self._lock = threading.Lock()  # Protege las estructuras compartidas entre hilos.
+        self.message_rate = message_rate
+        self.byte_rate = byte_rate
+        # Planificador que reparte la retransmisión de forma justa entre remitentes.
+        self._scheduler = _FairScheduler(
+            FAIR_QUANTUM, MAX_PENDING_JOBS, self._handle_error
+        )
+        self._stop_accepting = threading.Event()  # Se activa para dejar de aceptar conexiones.
+        self._draining = False  # Indica que el servidor se está cerrando de forma ordenada.
+        self._started_at = time.monotonic()  # Momento de arranque, para informar el tiempo activo.
+        self.presence_max_room = presence_max_room
+        self._presence = {"joined": [], "left": []}  # Altas y bajas pendientes de difundir.
+        self._presence_timer = None  # Temporizador que difunde el lote de presencia.
         self.on_client_connected = on_client_connected
         self.on_client_disconnected = on_client_disconnected
         self.on_message_received = on_message_received
         self.on_error = on_error
+        # Captura del tráfico entrante para reproducirlo después con replay.py.
+        self.capture = CaptureWriter(capture_path) if capture_path else None
+
+        # Si heredamos los sockets de escucha, no hace falta crearlos ni vincularlos.
+        if sock is not None:
+            self.listeners = sock if isinstance(sock, list) else [sock]
+        else:
+            # La dirección principal (IPv4 o IPv6) y las adicionales.
+            addresses = [(socket.AF_INET6 if ":" in host else socket.AF_INET, (host, port))]
+            for endpoint in endpoints or []:
+                try:
+                    addresses.append(protocol.parse_endpoint(endpoint, port))
+                except ValueError as e:
+                    self._handle_error(str(e))
+            self.listeners = []
+            for family, address in addresses:
+                listener = self._create_listener(family, address)
+                if listener:
+                    self.listeners.append(listener)
+        # El primer socket de escucha se mantiene como `sock` por compatibilidad.
+        self.sock = self.listeners[0] if self.listeners else None
 
-        # Configuración del socket.
+    def _create_listener(self, family, address):
+        """
+        Crea un socket de escucha para una dirección TCP (IPv4/IPv6) o Unix.
+
+        :return: El socket en modo escucha, o None si no se pudo crear.
+        """
+        if family == protocol.AF_UNIX and not self._clear_unix_path(address):
+            return None
         try:
-            self.sock = socket.socket(
-                socket.AF_INET, socket.SOCK_STREAM
-            )  # Creamos el socket TCP.
-            self.sock.setsockopt(
-                socket.SOL_SOCKET, socket.SO_REUSEADDR, 1
-            )  # Permite reutilizar el socket.
-            self.sock.bind(
-                (HOST, PORT)
-            )  # Vinculamos el socket a la IP y el puerto especificados.
-            self.sock.listen()  # Colocamos el socket en modo de escucha.
+            listener = socket.socket(family, socket.SOCK_STREAM)  # Creamos el socket.
+            if family != protocol.AF_UNIX:
+                listener.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_REUSEADDR, 1
+                )  # Permite reutilizar el socket.
+            if family == socket.AF_INET6:
+                # Sólo IPv6: así puede convivir con un socket IPv4 en el mismo puerto.
+                listener.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+            listener.bind(address)  # Vinculamos el socket a la dirección especificada.
+            listener.listen()  # Colocamos el socket en modo de escucha.
+            return listener
         except Exception as e:
             self._handle_error(
-                f"Error al inicializar el servidor: {e}"
+                f"Error al inicializar el servidor en {address}: {e}"
             )  # Manejo de errores en la configuración.
+            return None
+
+    def _clear_unix_path(self, path):
+        """
+        Prepara la ruta de un socket Unix: sólo elimina el socket abandonado de una
+        ejecución anterior. Nunca borra archivos normales ni sockets que siguen en uso.
+
+        :return: True si la ruta quedó libre para vincularla.
+        """
+        try:
+            mode = os.stat(path).st_mode
+        except FileNotFoundError:
+            return True
+        if not stat.S_ISSOCK(mode):
+            self._handle_error(f"No se escucha en {path}: la ruta existe y no es un socket.")
+            return False
+        probe = socket.socket(protocol.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.settimeout(1)
+            probe.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            pass  # Nadie escucha: es el socket de una ejecución anterior.
+        except OSError as e:
+            self._handle_error(f"No se escucha en {path}: no se pudo comprobar el socket ({e}).")
+            return False
+        else:
+            self._handle_error(f"No se escucha en {path}: otro proceso ya atiende ese socket.")
+            return False
+        finally:
+            probe.close()
+        try:
+            os.unlink(path)  # Eliminamos el socket de una ejecución anterior.
+        except FileNotFoundError:
+            pass
+        return True
 
     def run(self):
         """Ejecuta el servidor y espera conexiones entrantes."""
+        if not self.listeners:
+            # Sin sockets de escucha nadie podría conectarse: no fingimos estar en marcha.
+            self._handle_error("No se pudo abrir ningún socket de escucha; el servidor no se inicia.")
+            return
         try:
-            while True:
-                conn, addr = self.sock.accept()  # Acepta una conexión entrante.
-                self._handle_new_connection(conn, addr)  # Maneja la nueva conexión.
+            with selectors.DefaultSelector() as selector:
+                for listener in self.listeners:
+                    # Los sockets de escucha no bloquean: si otro proceso los comparte
+                    # (reinicio en caliente) y se adelanta a aceptar, seguimos esperando.
+                    listener.setblocking(False)
+                    selector.register(listener, selectors.EVENT_READ)
+                while not self._stop_accepting.is_set():
+                    for key, _ in selector.select(timeout=ACCEPT_POLL):
+                        try:
+                            conn, addr = key.fileobj.accept()  # Acepta una conexión entrante.
+                        except BlockingIOError:
+                            continue
+                        # El saludo se atiende en un hilo propio para que un cliente lento
+                        # no detenga la aceptación de conexiones.
+                        threading.Thread(
+                            target=self._handle_new_connection,
+                            args=(conn, addr),
+                            daemon=True,
+                        ).start()
         except Exception as e:
-            self._handle_error(f"Error al ejecutar el servidor: {e}")
+            if not self._stop_accepting.is_set():
+                self._handle_error(f"Error al ejecutar el servidor: {e}")
+
+    def stop_accepting(self):
+        """Deja de aceptar conexiones nuevas sin cerrar el socket de escucha."""
+        self._stop_accepting.set()
+
+    def shutdown(self, restart=False, timeout=DRAIN_TIMEOUT):
+        """
+        Cierra el servidor de forma ordenada.
+
+        Deja de aceptar conexiones, termina de retransmitir los mensajes pendientes,
+        avisa a los clientes, vacía sus colas de salida y cierra las conexiones.
+
+        :param restart: Si es True, avisa de un reinicio para que los clientes se reconecten
+            repartidos en una ventana de RECONNECT_JITTER_MS en lugar de todos a la vez.
+        :param timeout: Tiempo máximo para vaciar las colas.
+        """
+        self._stop_accepting.set()
+        self._draining = True
+        deadline = time.monotonic() + timeout
+        self._scheduler.wait_idle(timeout)  # Retransmite lo que ya se había recibido.
+
+        if restart:
+            self._broadcast_system_message(
+                "El servidor se está reiniciando.",
+                protocol.encode_control(protocol.RESTART, RECONNECT_JITTER_MS),
+            )
+        else:
+            self._broadcast_system_message("El servidor se está apagando.")
+        with self._lock:
+            sessions = list(self.sessions.items())
+        for conn, session in sessions:
+            session.flush(max(0, deadline - time.monotonic()))
+            try:
+                conn.shutdown(socket.SHUT_RDWR)  # El hilo lector terminará la desconexión.
+            except OSError:
+                pass
+        for listener in self.listeners:
+            # Si no es un reinicio, eliminamos también la ruta de los sockets Unix
+            # (en un reinicio la ruta pertenece ahora al proceso nuevo).
+            if not restart and listener.family == protocol.AF_UNIX:
+                try:
+                    os.unlink(listener.getsockname())
+                except OSError:
+                    pass
+            listener.close()  # Un proceso que heredó el socket de escucha lo mantiene abierto.
+        if self.capture:
+            self.capture.finish()  # Vacía a disco lo que quede en el búfer.
+
+    def health(self):
+        """
+        Devuelve el estado del servidor para las sondas de salud.
+
+        :return: Diccionario con el estado, si acepta clientes, el número de clientes y la carga.
+        """
+        with self._lock:
+            clients = len(self.sessions)
+            transfers = len(self.transfers)
+        return {
+            "status": "draining" if self._draining else "ok",
+            "ready": not self._stop_accepting.is_set(),
+            "clients": clients,
+            "load": {"pending_relays": self._scheduler.pending(), "transfers": transfers},
+            "uptime": round(time.monotonic() - self._started_at, 3),
+        }
+
+    def _answer_health(self, conn):
+        """Responde a una sonda de salud y cierra la conexión."""
+        try:
+            conn.sendall(protocol.encode_frame(json.dumps(self.health())))
+        except OSError:
+            pass  # La sonda ya se fue: no es un error del chat.
+        finally:
+            conn.close()
 
     def _handle_new_connection(self, conn, addr):
         """Maneja una nueva conexión de cliente."""
         try:
             # Recibe el encabezado que indica la longitud del alias.
-            data_header = conn.recv(HEADER_SIZE).decode("utf-8").strip()
+            raw_header = protocol.recv_exact(conn, HEADER_SIZE)
+            if raw_header == protocol.PING_HEADER:  # Sonda de salud: no es un cliente del chat.
+                self._answer_health(conn)
+                return
+            data_header = raw_header.decode("utf-8").strip()
             if (
                 not data_header
             ):  # Si no se recibe un encabezado válido, cierra la conexión.
@@ -68,8 +518,10 @@ class Server:
             alias_length = int(
                 data_header
             )  # Convierte el encabezado en la longitud esperada.
+            if not 0 < alias_length <= protocol.MAX_FRAME_SIZE:
+                raise ValueError(f"Longitud de alias no válida ({alias_length}) desde {addr}.")
             alias = (
-                conn.recv(alias_length).decode("utf-8").strip()
+                protocol.recv_exact(conn, alias_length).decode("utf-8").strip()
             )  # Recibe el alias del cliente.
 
             if not alias:  # Si no se recibe un alias válido, cierra la conexión.
@@ -77,9 +529,35 @@ class Server:
                     f"Alias vacío recibido desde {addr}. Cerrando conexión."
                 )
 
-            # Almacena el alias y la conexión.
-            self.aliases[conn] = alias
-            self.connections.append(conn)
+            # El alias viaja como campo de las tramas de control (separados por "|") y forma
+            # parte del nombre de los archivos recibidos: no puede contener separadores.
+            reason = None
+            if alias.startswith("\x00") or any(c in alias for c in "|/\\"):
+                # El motivo tampoco puede llevar "|": es el último campo de la trama REJECT.
+                reason = "El alias no puede contener barras verticales, '/' ni '\\'."
+
+            # Almacena el alias, la conexión y su sesión de salida.
+            with self._lock:
+                # El alias debe ser único ('chat_user' es el alias anónimo y puede repetirse).
+                if reason is None and alias != "chat_user" and alias in self.alias_index:
+                    reason = f"El alias '{alias}' ya está en uso."
+                rejected = reason is not None
+                if not rejected:
+                    session = _ClientSession(conn, addr, alias, self._handle_error)
+                    session.send(protocol.encode_control(protocol.WELCOME))
+                    self.aliases[conn] = alias
+                    self.connections.append(conn)
+                    self.sessions[conn] = session
+                    if alias != "chat_user":
+                        self.alias_index[alias] = session
+            if rejected:
+                conn.sendall(protocol.encode_control(protocol.REJECT, reason))
+                raise ValueError(
+                    f"Alias rechazado {alias!r} desde {addr}: {reason} Cerrando conexión."
+                )
+
+            if self.capture:
+                self.capture.open(conn, alias)
 
             # Llama al callback para notificar la conexión.
             if self.on_client_connected:
@@ -87,79 +565,309 @@ class Server:
 
             # Si el alias no es 'chat_user', notifica a los demás usuarios.
             if alias != "chat_user":
-                self._broadcast_system_message(f"{alias} se ha unido al chat.")
-
-            # Inicia un hilo para manejar la comunicación con este cliente.
-            threading.Thread(
-                target=self._handle_client, args=(conn,), daemon=True
-            ).start()
+                self._queue_presence("joined", alias)
         except Exception as e:
             self._handle_error(str(e))
             conn.close()  # Cierra la conexión en caso de error.
+            return
+
+        # Este mismo hilo atiende a partir de ahora la comunicación con el cliente.
+        self._handle_client(conn)
 
     def _handle_client(self, conn):
         """Maneja la comunicación con un cliente."""
         alias = self.aliases.get(conn, "Desconocido")  # Obtiene el alias del cliente.
+        # Límites de tasa propios de esta conexión.
+        message_bucket = (
+            _TokenBucket(self.message_rate, MESSAGE_BURST) if self.message_rate else None
+        )
+        byte_bucket = _TokenBucket(self.byte_rate, BYTE_BURST) if self.byte_rate else None
+        with self._lock:
+            session = self.sessions.get(conn)  # Para confirmar los mensajes con clave.
         try:
             while True:
-                # Recibe el encabezado del mensaje.
-                data_header = conn.recv(HEADER_SIZE)
+                # Recibe una trama completa (encabezado + contenido).
+                payload = protocol.recv_frame(conn)
                 if (
-                    not data_header
+                    payload is None
                 ):  # Si no hay datos, se asume que el cliente se desconectó.
                     break
+                if self.capture:  # Se graba al llegar, antes de aplicar los límites de tasa.
+                    self.capture.frame(conn, payload)
+
+                # Si el cliente supera su tasa, dejamos de leer de su socket un tiempo.
+                delay = byte_bucket.consume(len(payload)) if byte_bucket else 0.0
+                is_chunk = (
+                    protocol.is_control(payload)
+                    and protocol.control_kind(payload) == protocol.FILE_CHUNK
+                )
+                if message_bucket and not is_chunk:  # Los fragmentos sólo cuentan en bytes.
+                    delay = max(delay, message_bucket.consume(1))
+                if delay:
+                    time.sleep(delay)
+
+                # Un mensaje con clave (reenvío de la bandeja de salida del cliente) se trata
+                # como uno normal salvo que la clave ya se haya visto. Se confirma en ambos
+                # casos para que el cliente lo retire de su bandeja.
+                ack = None
+                if protocol.is_control(payload) and protocol.control_kind(payload) == protocol.SEND:
+                    _, (key,), payload = protocol.parse_control(payload, 1)
+                    ack = protocol.encode_control(protocol.SEND_ACK, key)
+                    if self._is_duplicate(key):
+                        session.send(ack)
+                        continue
 
-                # Recibe el contenido del mensaje basado en el encabezado.
-                length = int(data_header.strip())
-                data = conn.recv(length).decode("utf-8")
+                # Las tramas de control (archivos) se procesan aparte.
+                if protocol.is_control(payload):
+                    self._scheduler.submit(
+                        conn,
+                        len(payload),
+                        lambda payload=payload: self._handle_control(conn, alias, payload),
+                    )
+                    continue
+
+                data = payload.decode("utf-8")
 
                 # Llama al callback para manejar el mensaje recibido.
                 if self.on_message_received:
                     self.on_message_received(alias, data)
 
-                # Envía el mensaje a todos los demás clientes.
-                self._broadcast_message(alias, data, conn)
+                # Envía el mensaje a todos los demás clientes, en el turno de este remitente.
+                self._scheduler.submit(
+                    conn,
+                    len(payload),
+                    lambda data=data: self._broadcast_message(alias, data, conn),
+                )
+                if ack:
+                    session.send(ack)
         except Exception as e:
             self._handle_error(f"Error manejando mensajes de {alias}: {e}")
         finally:
             self._disconnect_client(conn)  # Desconecta al cliente si ocurre un error.
 
+    def _is_duplicate(self, key):
+        """
+        Registra una clave de idempotencia y devuelve True si ya se había recibido.
+
+        Sólo se recuerdan las SEEN_KEYS_MAX claves más recientes.
+        """
+        with self._lock:
+            if key in self._seen_keys:
+                return True
+            self._seen_keys[key] = None
+            if len(self._seen_keys) > SEEN_KEYS_MAX:
+                self._seen_keys.popitem(last=False)
+            return False
+
+    def _handle_control(self, conn, alias, payload):
+        """Procesa una trama de control de transferencia de archivos."""
+        kind = protocol.control_kind(payload)
+        if kind == protocol.DIRECT:
+            _, (target,), data = protocol.parse_control(payload, 1)
+            self._send_direct_message(conn, alias, target, data.decode("utf-8"))
+        elif kind == protocol.ROSTER:
+            self._send_roster(conn)
+        elif kind == protocol.FILE_OFFER:
+            _, (transfer_id, size, name), _ = protocol.parse_control(payload, 3)
+            with self._lock:
+                # Los destinatarios se fijan al anunciar el archivo.
+                recipients = [s for c, s in self.sessions.items() if c != conn]
+                self.transfers[(conn, transfer_id)] = recipients
+                self._unacked[(conn, transfer_id)] = 0
+            frame = protocol.encode_control(
+                protocol.FILE_OFFER, alias, transfer_id, size, name
+            )
+            for session in recipients:
+                session.send_bulk(frame)
+        elif kind == protocol.FILE_CHUNK:
+            _, (transfer_id, seq), data = protocol.parse_control(payload, 2)
+            self._relay_chunk(conn, alias, transfer_id, seq, data)
+        elif kind in (protocol.FILE_END, protocol.FILE_ABORT):
+            _, (transfer_id,), _ = protocol.parse_control(payload, 1)
+            with self._lock:
+                recipients = self.transfers.pop((conn, transfer_id), [])
+                self._unacked.pop((conn, transfer_id), None)
+            frame = protocol.encode_control(kind, alias, transfer_id)
+            for session in recipients:
+                session.send_bulk(frame)
+        else:
+            self._handle_error(f"Trama de control desconocida de {alias}: {kind!r}")
+
+    def _relay_chunk(self, conn, alias, transfer_id, seq, data):
+        """
+        Retransmite un fragmento de archivo sin acumular el archivo completo.
+
+        El servidor confirma el fragmento al emisor (FILE_ACK) sólo cuando ha salido
+        hacia todos los destinatarios, así la ventana del emisor limita la memoria usada.
+        La ventana también se comprueba aquí: si el emisor envía más de FILE_WINDOW
+        fragmentos sin confirmar, la transferencia se cancela. El emisor recibe FILE_ABORT
+        tanto en ese caso como si la transferencia no existe.
+        """
+        key = (conn, transfer_id)
+        with self._lock:
+            recipients = self.transfers.get(key)
+            sender = self.sessions.get(conn)
+            overflow = bool(recipients) and self._unacked.get(key, 0) >= protocol.FILE_WINDOW
+            if overflow:
+                del self.transfers[key]
+                del self._unacked[key]
+            elif recipients:
+                self._unacked[key] += 1
+        if overflow or recipients is None:
+            frame = protocol.encode_control(protocol.FILE_ABORT, alias, transfer_id)
+            if overflow:
+                self._handle_error(f"{alias} no respetó la ventana de la transferencia {transfer_id}.")
+                for session in recipients:
+                    session.send_bulk(frame)
+            # También avisamos al emisor: si no, esperaría para siempre confirmaciones que no llegarán.
+            if sender is not None:
+                sender.send(frame)
+            return
+        if sender is None:
+            return
+        ack = protocol.encode_control(protocol.FILE_ACK, transfer_id, seq)
+        if not recipients:  # Nadie más está conectado: confirmamos de inmediato.
+            sender.send(ack)
+            return
+
+        frame = protocol.encode_control(
+            protocol.FILE_CHUNK, alias, transfer_id, seq, data=data
+        )
+        pending = [len(recipients)]  # Contador de destinatarios que faltan por recibirlo.
+        pending_lock = threading.Lock()
+
+        def on_sent():
+            with pending_lock:
+                pending[0] -= 1
+                done = pending[0] == 0
+            if done:
+                with self._lock:
+                    if key in self._unacked:
+                        self._unacked[key] -= 1
+                sender.send(ack)
+
+        for session in recipients:
+            session.send_bulk(frame, on_sent)
+
+    def _send_direct_message(self, sender_conn, alias, target, message):
+        """Entrega un mensaje privado únicamente a la conexión del alias de destino."""
+        with self._lock:
+            recipient = self.alias_index.get(target)
+            sender = self.sessions.get(sender_conn)
+        if recipient is None:
+            # Avisamos sólo al remitente de que el destinatario no está conectado.
+            if sender:
+                sender.send(
+                    protocol.encode_frame(f"Sistema|El usuario {target} no está conectado.")
+                )
+            return
+        recipient.send(
+            protocol.encode_control(protocol.DIRECT, alias, data=message.encode("utf-8"))
+        )
+
     def _broadcast_message(self, alias, message, sender_conn):
         """Envía un mensaje a todos los clientes excepto al remitente."""
         alias_message = (
             f"{alias}|{message}"  # Formatea el mensaje con alias y contenido.
         )
-        for connection in self.connections:
-            if connection != sender_conn:  # Evita enviar el mensaje al remitente.
-                try:
-                    # Prepara el encabezado y envía el mensaje.
-                    header = f"{len(alias_message):<{HEADER_SIZE}}".encode("utf-8")
-                    connection.send(header + alias_message.encode("utf-8"))
-                except Exception as e:
-                    self._handle_error(f"Error al retransmitir mensaje: {e}")
+        # Codificamos la trama una sola vez para todos los destinatarios.
+        frame = protocol.encode_frame(alias_message)
+        with self._lock:
+            sessions = [s for c, s in self.sessions.items() if c != sender_conn]
+        for session in sessions:  # Evita enviar el mensaje al remitente.
+            session.send(frame)
+
+    def _broadcast_system_message(self, message, control=b""):
+        """
+        Envía un mensaje del sistema a todos los clientes conectados.
 
-    def _broadcast_system_message(self, message):
-        """Envía un mensaje del sistema a todos los clientes conectados."""
+        :param control: Trama de control ya codificada que se envía justo detrás del mensaje.
+        """
         alias = "Sistema"  # Define el alias para los mensajes del sistema.
         formatted_message = f"{alias}|{message}"  # Formatea el mensaje del sistema.
-        for connection in self.connections:
-            try:
-                # Prepara el encabezado y envía el mensaje.
-                header = f"{len(formatted_message):<{HEADER_SIZE}}".encode("utf-8")
-                connection.send(header + formatted_message.encode("utf-8"))
-            except Exception as e:
-                self._handle_error(f"Error al enviar mensaje del sistema: {e}")
+        frame = protocol.encode_frame(formatted_message) + control
+        with self._lock:
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            session.send(frame)
+
+    def _queue_presence(self, event, alias):
+        """
+        Agrupa una alta ("joined") o baja ("left") para difundirla junto a las demás
+        que ocurran en los próximos PRESENCE_WINDOW segundos.
+        """
+        opposite = "left" if event == "joined" else "joined"
+        with self._lock:
+            if alias in self._presence[opposite]:
+                # Una baja y una alta del mismo alias en la misma ventana se anulan
+                # (p. ej. una reconexión): no hace falta avisar a nadie.
+                self._presence[opposite].remove(alias)
+            else:
+                self._presence[event].append(alias)
+            if self._presence_timer is None:
+                self._presence_timer = threading.Timer(PRESENCE_WINDOW, self._flush_presence)
+                self._presence_timer.daemon = True
+                self._presence_timer.start()
+
+    def _flush_presence(self):
+        """Difunde en una sola trama las altas y bajas acumuladas."""
+        with self._lock:
+            presence = self._presence
+            self._presence = {"joined": [], "left": []}
+            self._presence_timer = None
+            sessions = list(self.sessions.values())
+        if not presence["joined"] and not presence["left"]:
+            return
+        # En salas muy grandes la presencia sólo se consulta bajo demanda (ROSTER).
+        if len(sessions) > self.presence_max_room:
+            return
+        frame = protocol.encode_control(
+            protocol.PRESENCE, data=json.dumps(presence).encode("utf-8")
+        )
+        for session in sessions:
+            session.send(frame)
+
+    def _send_roster(self, conn):
+        """Envía al cliente la lista de usuarios conectados."""
+        with self._lock:
+            session = self.sessions.get(conn)
+            users = sorted(self.alias_index)
+        if session:
+            session.send(
+                protocol.encode_control(
+                    protocol.ROSTER, data=json.dumps({"users": users}).encode("utf-8")
+                )
+            )
 
     def _disconnect_client(self, conn):
         """Desconecta a un cliente del servidor."""
-        alias = self.aliases.pop(conn, "Desconocido")  # Obtiene el alias del cliente.
-        if conn in self.connections:
-            self.connections.remove(conn)  # Elimina la conexión de la lista.
+        with self._lock:
+            alias = self.aliases.pop(conn, "Desconocido")  # Obtiene el alias del cliente.
+            if conn in self.connections:
+                self.connections.remove(conn)  # Elimina la conexión de la lista.
+            session = self.sessions.pop(conn, None)
+            if session and self.alias_index.get(alias) is session:
+                del self.alias_index[alias]  # Libera el alias para futuras conexiones.
+            # Cancela las transferencias que el cliente dejó a medias.
+            aborted = [key for key in self.transfers if key[0] == conn]
+            for key in aborted:
+                self._unacked.pop(key, None)
+            aborted = [(key[1], self.transfers.pop(key)) for key in aborted]
+        if self.capture:
+            self.capture.close(conn)
+        if session:
+            session.close()  # Detiene su hilo escritor.
         conn.close()  # Cierra el socket.
 
+        for transfer_id, recipients in aborted:
+            frame = protocol.encode_control(protocol.FILE_ABORT, alias, transfer_id)
+            for recipient in recipients:
+                recipient.send_bulk(frame)
+
         # Si el alias no es 'chat_user', notifica la desconexión a los demás usuarios.
-        if alias != "chat_user":
-            self._broadcast_system_message(f"{alias} se ha desconectado.")
+        # Durante un cierre ordenado no se notifica: todos los clientes se desconectan.
+        if alias != "chat_user" and not self._draining:
+            self._queue_presence("left", alias)
 
         # Llama al callback para notificar la desconexión.
         if self.on_client_disconnected:
@@ -1,29 +1,56 @@
+import json  # Importamos json para interpretar la respuesta de las sondas de salud.
+import os  # Importamos os para manejar la ruta del socket de traspaso.
+import sys  # Importamos sys para leer los argumentos de la línea de comandos.
+import tempfile  # Importamos tempfile para ubicar el socket de traspaso.
 import threading  # Importamos threading para manejar el servidor en un hilo separado.
 import socket  # Importamos socket para las conexiones TCP/IP.
-from server import Server  # Importamos la clase Server desde el módulo server.
+import protocol  # Importamos el protocolo para enviar sondas de salud.
 
 # Variables globales para manejar la instancia del servidor y su hilo de ejecución.
 _server_instance = None  # Variable para almacenar la instancia del servidor.
 _server_thread = None  # Variable para almacenar el hilo del servidor.
+_stop_event = threading.Event()  # Se activa cuando el proceso debe terminar (comando "exit" o traspaso).
+
+def handoff_path(port):
+    """
+    Ruta del socket Unix por el que un proceso nuevo pide los sockets de escucha al proceso
+    en ejecución. Depende del puerto para que cada servidor tenga el suyo.
+    """
+    return os.path.join(tempfile.gettempdir(), f"chat_server_handoff_{port}.sock")
+
+def check_health(host="127.0.0.1", port=5000, timeout=2):
+    """
+    Envía una sonda de salud al servidor.
+
+    La sonda no pasa por el saludo del chat: el servidor responde con su estado
+    y cierra la conexión.
+
+    :param host: Dirección IP donde se ejecuta el servidor (o "unix:/ruta").
+    :param port: Puerto donde se ejecuta el servidor.
+    :param timeout: Segundos máximos de espera.
+    :return: Diccionario con `status`, `ready`, `clients`, `load` y `uptime`, o None si no responde.
+    """
+    try:
+        with protocol.open_connection(host, port, timeout=timeout) as probe:
+            probe.sendall(protocol.PING_HEADER)
+            payload = protocol.recv_frame(probe)
+        return json.loads(payload) if payload else None
+    except (OSError, ValueError):
+        # Si no podemos conectar o la respuesta no es válida, el servidor no está disponible.
+        return None
 
 def is_server_running(host="127.0.0.1", port=5000):
     """
-    Verifica si el servidor está activo intentando conectarse a su puerto.
+    Verifica si el servidor está activo y aceptando clientes mediante una sonda de salud.
 
     :param host: Dirección IP donde se ejecuta el servidor.
     :param port: Puerto donde se ejecuta el servidor.
     :return: True si el servidor está activo, False de lo contrario.
     """
-    try:
-        # Intentamos conectarnos al servidor con un timeout de 2 segundos.
-        test_sock = socket.create_connection((host, port), timeout=2)
-        test_sock.close()  # Cerramos el socket de prueba si la conexión fue exitosa.
-        return True
-    except (ConnectionRefusedError, socket.timeout):
-        # Si no podemos conectar, asumimos que el servidor no está corriendo.
-        return False
+    health = check_health(host, port)
+    return bool(health and health.get("ready"))
 
-def start_server(on_client_connected, on_client_disconnected, on_message_received, on_error, host="127.0.0.1", port=5000):
+def start_server(on_client_connected, on_client_disconnected, on_message_received, on_error, host="127.0.0.1", port=5000, sock=None, endpoints=None, capture_path=None, message_rate=None, byte_rate=None):
     """
     Inicia el servidor en un hilo separado si aún no está en ejecución.
 
@@ -33,6 +60,13 @@ def start_server(on_client_connected, on_client_disconnected, on_message_receive
     :param on_error: Callback para manejar errores.
     :param host: Dirección IP del servidor.
     :param port: Puerto del servidor.
+    :param sock: Sockets de escucha heredados (ver `take_over`).
+    :param endpoints: Direcciones de escucha adicionales, p. ej. "[::1]:5000" o "unix:/tmp/chat.sock".
+    :param capture_path: Archivo donde grabar el tráfico entrante (ver replay.py).
+    :param message_rate: Mensajes por segundo por cliente; None usa el límite por defecto
+        del servidor (`server.MESSAGE_RATE`) y 0 lo desactiva.
+    :param byte_rate: Bytes por segundo por cliente; None usa `server.BYTE_RATE` y 0 lo desactiva.
+    :raises OSError: Si no se pudo abrir ningún socket de escucha.
     """
     global _server_instance, _server_thread
 
@@ -41,30 +75,122 @@ def start_server(on_client_connected, on_client_disconnected, on_message_receive
         print("[DEBUG] El servidor ya está en ejecución.")
         return
 
+    # Importamos el servidor sólo al iniciarlo: quien únicamente consulta su estado
+    # (por ejemplo la interfaz gráfica) no paga el coste de cargarlo.
+    from server import Server  # Importamos la clase Server desde el módulo server.
+
+    # Sólo pasamos los límites indicados: el resto conserva el valor por defecto del servidor.
+    limits = {
+        name: value or None  # El servidor desactiva el límite con None.
+        for name, value in (("message_rate", message_rate), ("byte_rate", byte_rate))
+        if value is not None
+    }
+
     # Creamos una nueva instancia del servidor, pasando los callbacks correspondientes.
     _server_instance = Server(
         on_client_connected=on_client_connected,
         on_client_disconnected=on_client_disconnected,
         on_message_received=on_message_received,
         on_error=on_error,
+        sock=sock,
+        host=host,
+        port=port,
+        endpoints=endpoints,
+        capture_path=capture_path,
+        **limits,
     )
 
+    if not _server_instance.listeners:
+        # Ya se informó del motivo por `on_error` al crear los sockets.
+        if _server_instance.capture:
+            _server_instance.capture.finish()
+        _server_instance = None
+        raise OSError(f"No se pudo iniciar el servidor en {host}:{port}.")
+
     # Creamos un hilo separado para ejecutar el servidor.
     _server_thread = threading.Thread(target=_server_instance.run, daemon=True)
     _server_thread.start()  # Iniciamos el hilo del servidor.
     print(f"[DEBUG] Servidor iniciado en {host}:{port}.")
+    for listener in _server_instance.listeners[1:]:  # Sólo las direcciones que se abrieron.
+        print(f"[DEBUG] Escuchando también en {listener.getsockname()}.")
 
-def stop_server():
+def stop_server(restart=False):
     """
-    Detiene el servidor cerrando el socket y el hilo del servidor.
+    Detiene el servidor de forma ordenada: deja de aceptar conexiones, vacía las colas
+    de salida, avisa a los clientes y cierra las conexiones.
+
+    :param restart: Si es True, avisa a los clientes de que el servidor se reinicia.
     """
     global _server_instance, _server_thread
 
     if _server_instance:
-        _server_instance.sock.close()  # Cerramos el socket del servidor.
+        _server_instance.shutdown(restart=restart)  # Cierre ordenado del servidor.
+        _server_instance = None
         print("[DEBUG] Servidor detenido.")
     if _server_thread:
         _server_thread.join(timeout=1)  # Esperamos a que el hilo termine.
+        _server_thread = None
+
+def serve_handoff(port=5000):
+    """
+    Espera en un socket Unix a que un proceso nuevo pida el socket de escucha.
+
+    Cuando llega la petición, el servidor actual deja de aceptar conexiones, envía el
+    descriptor del socket de escucha al proceso nuevo y se cierra de forma ordenada.
+    Así el puerto nunca deja de escuchar durante un despliegue.
+
+    :param port: Puerto del servidor; determina la ruta del socket de traspaso.
+    :return: True si el traspaso está disponible en esta plataforma.
+    """
+    if not hasattr(socket, "send_fds"):  # Requiere sockets Unix (Python 3.9+, no Windows).
+        return False
+    path = handoff_path(port)
+    try:
+        os.unlink(path)  # Eliminamos un socket anterior (el de un proceso ya reemplazado).
+    except FileNotFoundError:
+        pass
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+    threading.Thread(target=_handoff_loop, args=(listener,), daemon=True).start()
+    return True
+
+def _handoff_loop(listener):
+    """
+    Atiende una petición de traspaso y cierra el servidor actual.
+    """
+    with listener:
+        conn, _ = listener.accept()
+    with conn:
+        _server_instance.stop_accepting()  # El proceso nuevo aceptará a partir de ahora.
+        fds = [listener.fileno() for listener in _server_instance.listeners]
+        socket.send_fds(conn, [b"chat"], fds)
+    print("[DEBUG] Socket de escucha traspasado a un proceso nuevo.")
+    stop_server(restart=True)
+    _stop_event.set()
+
+def take_over(port=5000, timeout=5):
+    """
+    Pide al servidor en ejecución sus sockets de escucha para reemplazarlo sin cortes.
+
+    :param port: Puerto del servidor que se reemplaza.
+    :param timeout: Segundos máximos de espera.
+    :return: Lista de sockets de escucha heredados, o None si no hay servidor que
+        reemplazar (o la plataforma no permite el traspaso).
+    """
+    if not hasattr(socket, "recv_fds"):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(timeout)
+            conn.connect(handoff_path(port))
+            _, fds, _, _ = socket.recv_fds(conn, 16, 16)
+    except OSError as e:  # Sin socket de traspaso, rechazado o sin respuesta a tiempo.
+        print(f"[DEBUG] No se pudo heredar el servidor en ejecución: {e}")
+        return None
+    if not fds:
+        return None
+    return [socket.socket(fileno=fd) for fd in fds]
 
 # Callbacks predeterminados para manejar eventos del servidor.
 def on_client_connected(conn, addr, alias):
@@ -109,31 +235,71 @@ if __name__ == "__main__":
     """
     Punto de entrada principal (archivo que se ejecuta directamente)
     """
-    print("[DEBUG] Ejecutando server_manager.")
     host = "127.0.0.1"  # Dirección IP del servidor.
     port = 5000  # Puerto del servidor.
+    restart = "--restart" in sys.argv  # Reemplaza en caliente al servidor en ejecución.
+    # Direcciones de escucha adicionales: --listen=[::1]:5000 --listen=unix:/tmp/chat.sock
+    endpoints = [arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--listen=")]
+    # Grabación del tráfico entrante: --capture=trafico.cap
+    capture_path = next((arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--capture=")), None)
+    # Límites por cliente: --message-rate=200 --byte-rate=1048576 (0 desactiva el límite).
+    message_rate = next((float(arg.split("=", 1)[1]) for arg in sys.argv if arg.startswith("--message-rate=")), None)
+    byte_rate = next((float(arg.split("=", 1)[1]) for arg in sys.argv if arg.startswith("--byte-rate=")), None)
+
+    # Con --health sólo consultamos el estado (útil para monitorización) y salimos.
+    if "--health" in sys.argv:
+        health = check_health(host, port)
+        print(json.dumps(health))
+        sys.exit(0 if health and health.get("ready") else 1)
+
+    print("[DEBUG] Ejecutando server_manager.")
 
     # Verificamos si el servidor ya está en ejecución.
-    if is_server_running(host, port):
+    if not restart and is_server_running(host, port):
         print(f"[DEBUG] El servidor ya está en ejecución en {host}:{port}.")
     else:
+        # Si se pidió un reinicio, heredamos el socket de escucha del proceso actual;
+        # si no hay ninguno que reemplazar, abrimos los sockets como en un arranque normal.
+        sock = take_over(port) if restart else None
         # Si no está corriendo, lo iniciamos.
         print(f"[DEBUG] Iniciando servidor en {host}:{port}...")
-        start_server(
-            on_client_connected=on_client_connected,
-            on_client_disconnected=on_client_disconnected,
-            on_message_received=on_message_received,
-            on_error=on_error,
-            host=host,
-            port=port,
-        )
         try:
-            # Mantenemos el servidor activo hasta que el usuario ingrese "exit".
-            print("[DEBUG] Escribe 'exit' para detener el servidor.")
+            start_server(
+                on_client_connected=on_client_connected,
+                on_client_disconnected=on_client_disconnected,
+                on_message_received=on_message_received,
+                on_error=on_error,
+                host=host,
+                port=port,
+                sock=sock,
+                endpoints=endpoints,
+                capture_path=capture_path,
+                message_rate=message_rate,
+                byte_rate=byte_rate,
+            )
+        except OSError as e:
+            print(f"[ERROR] {e}")
+            sys.exit(1)
+        serve_handoff(port)  # Permite que un despliegue futuro nos reemplace sin cortes.
+
+        def read_commands():
+            """Lee comandos de la consola hasta que el usuario ingrese "exit"."""
+            # Leemos sin el búfer de sys.stdin: así este hilo no bloquea el cierre del
+            # intérprete si el proceso termina por un traspaso.
             while True:
-                cmd = input()  # Leemos el comando del usuario.
-                if cmd.strip().lower() == "exit":
-                    break
+                cmd = os.read(sys.stdin.fileno(), 1024)  # Leemos el comando del usuario.
+                if not cmd:
+                    return  # Sin consola (p. ej. como servicio): sólo termina por traspaso.
+                if cmd.strip().lower() == b"exit":
+                    _stop_event.set()
+                    return
+
+        try:
+            # Mantenemos el servidor activo hasta que el usuario ingrese "exit" o sea reemplazado.
+            print("[DEBUG] Escribe 'exit' para detener el servidor.")
+            threading.Thread(target=read_commands, daemon=True).start()
+            while not _stop_event.wait(timeout=1):
+                pass
         except KeyboardInterrupt:
             # Si el usuario interrumpe con Ctrl+C, detenemos el servidor.
             print("[DEBUG] Deteniendo servidor...")